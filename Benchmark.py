@@ -0,0 +1,108 @@
+import sys
+import time
+import asyncio
+import argparse
+
+import Spieler
+import Testumgebung
+
+#End-to-end benchmark of the player against the stand-ins from Testumgebung.py on loopback UDP.
+#Every case starts a fresh croupier, counter and set of bot sessions (Spieler.run_bots) in one event loop and reports
+#rounds/sec, p50/p99 round latency (bet sent -> game_result) and the datagrams per second that croupier and counter handled.
+
+
+def _reset_player():
+    Spieler.sessions.clear()
+    Spieler._recommendation_requests.clear()
+    Spieler.peer_wire_formats.clear()
+    Spieler.message_counters.clear()
+    Spieler.reliable_delivery = Spieler.ReliableDelivery()
+    Spieler.metrics = Spieler.Metrics()
+
+
+async def run_case(seats, seats_per_table=7, rounds=0, duration=5.0, loss=0.0, binary=False, reliable=False,
+                   source="local", num_sockets=1, capital=1000, prefetch=True, deadline=0.0, batched=True, rcvbuf=0, seed=None):
+    _reset_player()
+    Spieler.INITIAL_CAPITAL = capital
+    Spieler.BINARY_WIRE = binary
+    Spieler.RELIABLE = reliable
+    Spieler.PREFETCH = prefetch
+    Spieler.DECISION_DEADLINE = deadline
+    Spieler.BATCHED_RECEIVE = batched
+    Spieler.SOCKET_RCVBUF = rcvbuf
+    Spieler.impairment = Spieler.NetworkImpairment(loss, seed=seed) if loss else None
+    croupier, counter = await Testumgebung.start_stand_ins(seats_per_table=seats_per_table, reliable=reliable, seed=seed)
+    Spieler.CROUPIER_IP, Spieler.CROUPIER_PORT = croupier.transport.get_extra_info("sockname")[:2]
+    Spieler.COUNTER_IP, Spieler.COUNTER_PORT = counter.transport.get_extra_info("sockname")[:2]
+    Spieler.PLAYER_IP, Spieler.PLAYER_PORT = "127.0.0.1", 0
+
+    started = time.perf_counter()
+    try:
+        bots = await Spieler.run_bots(seats, num_sockets, rounds, duration, source, report=False)
+    finally:
+        croupier.close()
+        counter.close()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    latencies = sorted(l for bot in bots for l in bot.round_latencies)
+    player_rounds = sum(bot.rounds for bot in bots)
+    messages = croupier.received + croupier.sent + counter.received + counter.sent
+    return {
+        "seats": seats,
+        "loss": loss,
+        "rounds": player_rounds,
+        "table_rounds": croupier.rounds,
+        "rounds_per_sec": player_rounds / elapsed,
+        "p50_ms": Spieler._percentile(latencies, 0.5) * 1000,
+        "p99_ms": Spieler._percentile(latencies, 0.99) * 1000,
+        "messages_per_sec": messages / elapsed,
+        "retransmissions": Spieler.reliable_delivery.retransmissions,
+        "dropped": Spieler.impairment.dropped if Spieler.impairment is not None else 0,
+    }
+
+
+def _format(result):
+    return (f"{result['seats']:>5} {result['loss']:>7.1%} {result['rounds']:>8} {result['rounds_per_sec']:>10.1f} "
+            f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['messages_per_sec']:>11.0f} "
+            f"{result['retransmissions']:>7} {result['dropped']:>8}")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Durchsatz- und Latenz-Benchmark des Spielers gegen die Testumgebung")
+    parser.add_argument("--seats", type=int, nargs="+", default=[1, 7, 28], help="Anzahl Spieler je Durchlauf")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.0], help="Paketverlust je Durchlauf (0.0-1.0)")
+    parser.add_argument("--table-seats", type=int, default=7, help="Plätze pro Tisch")
+    parser.add_argument("--rounds", type=int, default=0, help="Runden pro Spieler (0 = nur --duration)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Laufzeit je Durchlauf in Sekunden")
+    parser.add_argument("--sockets", type=int, default=1, help="Anzahl Sockets, die sich die Spieler teilen")
+    parser.add_argument("--capital", type=int, default=1000, help="Startkapital je Spieler")
+    parser.add_argument("--source", choices=("counter", "local"), default="local", help="Empfehlungsquelle der Spieler")
+    parser.add_argument("--deadline", type=float, default=0.0, help="Sekunden bis zur Basisstrategie ohne Empfehlung (0 = warten)")
+    parser.add_argument("--no-batch", action="store_true", help="Pakete einzeln über den asyncio-Transport empfangen")
+    parser.add_argument("--rcvbuf", type=int, default=0, help="Empfangspuffer der Spieler-Sockets in Bytes (0 = Systemstandard)")
+    parser.add_argument("--no-prefetch", action="store_true", help="Empfehlungen erst im eigenen Zug anfragen")
+    parser.add_argument("--binary", action="store_true", help="Binäres Nachrichtenformat")
+    parser.add_argument("--reliable", action="store_true", help="ACKs und Wiederholungen")
+    parser.add_argument("--silent-reshuffle", action="store_true", help="Croupier kündigt neues Mischen nicht an, der Spieler erkennt es selbst")
+    parser.add_argument("--metrics", action="store_true", help="Zähler und Latenz-Histogramme des Spielers je Durchlauf ausgeben")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args(sys.argv[1:])
+    Spieler.log.set_level(Spieler.ERROR)
+    Testumgebung.ANNOUNCE_RESHUFFLE = not args.silent_reshuffle
+
+    print(f"Format: {'binär' if args.binary else 'JSON'}, {'zuverlässig' if args.reliable else 'ohne ACKs'}, "
+          f"Empfehlungen: {args.source}, {args.duration:g} s je Durchlauf")
+    print(f"{'Plätze':>5} {'Verlust':>7} {'Runden':>8} {'Runden/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'Pakete/s':>11} "
+          f"{'Wdh.':>7} {'Verworf.':>8}")
+    for loss in args.loss:
+        for seats in args.seats:
+            result = asyncio.run(run_case(seats, args.table_seats, args.rounds, args.duration, loss, args.binary,
+                                          args.reliable, args.source, args.sockets, args.capital, not args.no_prefetch, args.deadline, not args.no_batch, args.rcvbuf, args.seed))
+            print(_format(result), flush=True)
+            if args.metrics:
+                print(Spieler.metrics.render(), flush=True)
+    Spieler.log.flush()
@@ -0,0 +1,113 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import collections
+
+import Spieler
+
+#Replays a journal written with Spieler.py --journal as fast as possible: every message the player handled goes through
+#Spieler._handle_message again. A seat is created from its first snapshot, what the seats send goes into a sink instead
+#of the network. At the end the capital of every seat is compared with its last snapshot in the journal.
+#With --auto the seats bet and decide again with the current code (--source local uses the strategy engine) and every
+#player_action is compared with the one in the journal, so a journal doubles as a backtest for strategy changes.
+
+
+class _Sink:
+    def __init__(self):
+        self.sent = 0
+        self.actions = collections.defaultdict(list) #player_id -> actions sent during the replay
+
+    def sendto(self, data, peer):
+        self.sent += 1
+        message = json.loads(data)
+        if message.get("type") == "player_action":
+            payload = message["payload"]
+            self.actions[payload["player_id"]].append(payload["action"])
+
+
+def replay(path, auto=False, source="counter"):
+    records, _ = Spieler.read_journal(path)
+    sink = _Sink()
+    Spieler.transport = sink
+    Spieler.RELIABLE = False
+    Spieler.BINARY_WIRE = False
+    Spieler.impairment = None
+    Spieler.journal = None
+    Spieler.sessions.clear()
+
+    last_snapshots = {} #player_id -> last snapshot in the journal
+    recorded_actions = collections.defaultdict(list) #player_id -> actions in the journal
+    handled = 0
+    started = time.perf_counter()
+    for kind, _, peer, body in records:
+        if kind == Spieler.JOURNAL_IN:
+            Spieler._handle_message(Spieler.decode_journal_body(kind, body), peer)
+            handled += 1
+        elif kind == Spieler.JOURNAL_OUT:
+            if auto:
+                message = Spieler.decode_journal_body(kind, body)
+                if message.get("type") == "player_action":
+                    recorded_actions[message["payload"]["player_id"]].append(message["payload"]["action"])
+        elif kind == Spieler.JOURNAL_SNAPSHOT:
+            state = Spieler.decode_journal_body(kind, body)
+            last_snapshots[state["player_id"]] = state
+            if state["player_id"] not in Spieler.sessions:
+                session = Spieler.PlayerSession(state["player_id"], state["nickname"], state["capital"], auto=auto)
+                session.recommendation_source = source
+                session.restore(state)
+                Spieler.sessions[state["player_id"]] = session
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    compared = sum(min(len(actions), len(sink.actions[player_id])) for player_id, actions in recorded_actions.items())
+    agreed = sum(a == b for player_id, actions in recorded_actions.items() for a, b in zip(actions, sink.actions[player_id]))
+    return {
+        "records": len(records),
+        "handled": handled,
+        "elapsed": elapsed,
+        "sent": sink.sent,
+        "seats": [(session, last_snapshots[player_id]) for player_id, session in Spieler.sessions.items()],
+        "compared_actions": compared,
+        "agreed_actions": agreed,
+    }
+
+
+async def _replay_in_loop(*args):
+    #handlers may arm timers (decision deadline), so the replay runs inside an event loop
+    return replay(*args)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Spielt ein Spieler-Journal mit maximaler Geschwindigkeit erneut ab")
+    parser.add_argument("journal", help="Journal von Spieler.py --journal")
+    parser.add_argument("--auto", action="store_true", help="Sitze setzen und entscheiden neu, Aktionen werden mit dem Journal verglichen")
+    parser.add_argument("--source", choices=("counter", "local"), default="counter", help="Empfehlungsquelle beim erneuten Entscheiden")
+    parser.add_argument("--log-level", choices=Spieler.LOG_LEVELS, default="error")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args(sys.argv[1:])
+    Spieler.log.set_level(Spieler.LOG_LEVELS[args.log_level])
+
+    try:
+        result = asyncio.run(_replay_in_loop(args.journal, args.auto, args.source))
+    except (OSError, ValueError) as e:
+        print(f"Fehler: Journal {args.journal} kann nicht gelesen werden. {e}")
+        sys.exit(2)
+    Spieler.log.flush()
+
+    print(f"{result['records']} Einträge, {result['handled']} Nachrichten in {result['elapsed']:.3f} s "
+          f"({result['handled'] / result['elapsed']:.0f} Nachrichten/s), {result['sent']} Nachrichten gesendet")
+    mismatches = 0
+    for session, state in result["seats"]:
+        matches = session.player_capital == state["capital"]
+        mismatches += not matches
+        print(f"{session.nickname}: Kapital {session.player_capital} (Journal: {state['capital']}) "
+              f"{'OK' if matches else 'ABWEICHUNG'}, {session.rounds} Runden")
+    if args.auto:
+        compared = result["compared_actions"]
+        print(f"Aktionen: {result['agreed_actions']} von {compared} wie im Journal"
+              + (f" ({result['agreed_actions'] / compared:.1%})" if compared else ""))
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,289 @@
+import sys
+import time
+import argparse
+import concurrent.futures
+
+import numpy as np
+
+import Spieler
+
+#Offline Monte Carlo simulation of betting and playing policies.
+#Every row of the arrays is one independent player with its own shoe and bankroll, all rows are dealt and
+#resolved together, so a round costs a handful of numpy operations regardless of the number of players.
+#Card values are 2-11 like Card.value (J, Q, K are 10, the ace is 11), rules match the strategy engine in Spieler.py:
+#no hole card check (dealer blackjack beats doubled and split hands), no resplit, split aces get one card,
+#no double after split, surrender returns half the bet.
+
+STAND, HIT, DOUBLE_DOWN, SPLIT, SURRENDER = 0, 1, 2, 3, 4
+ACTION_CODES = {"STAND": STAND, "HIT": HIT, "DOUBLE_DOWN": DOUBLE_DOWN, "SPLIT": SPLIT, "SURRENDER": SURRENDER}
+PENETRATION = 0.75 #part of the shoe dealt before the croupier reshuffles
+MAX_CARDS_PER_ROUND = 30 #a shoe is reshuffled early if fewer cards than this are left
+HI_LO_BY_VALUE = np.array([0, 0, 1, 1, 1, 1, 1, 0, 0, 0, -1, -1], dtype=np.int16) #indexed by card value
+
+
+def _add_cards(total, soft, values):
+    #vectorized version of the ace handling in HandState.add
+    total = total + values
+    ace = values == 11
+    total = total - np.where(ace & soft, 10, 0) #only one ace can count as 11
+    soft = soft | ace
+    bust_soft = (total > 21) & soft
+    total = total - np.where(bust_soft, 10, 0)
+    soft = soft & ~bust_soft
+    return total, soft
+
+
+#Bet policies: bets(capital, true_count) -> array of bets (0 means the player does not play)
+class FlatBet:
+    def __init__(self, amount):
+        self.amount = amount
+
+    def bets(self, capital, true_count):
+        return np.where(capital >= self.amount, float(self.amount), 0.0)
+
+
+class KellyBet:
+    #same sizing as determine_optimal_bet (Spieler.kelly_bet) for the Hi-Lo true count
+    def bets(self, capital, true_count):
+        edge = Spieler.BASE_EDGE + Spieler.EDGE_PER_TRUE_COUNT * true_count
+        bet = np.where(edge > 0, capital * Spieler.KELLY_FRACTION * edge / Spieler.HAND_VARIANCE, 0.0)
+        bet = np.floor(np.minimum(np.clip(bet, Spieler.TABLE_MIN, Spieler.TABLE_MAX), capital))
+        return np.where(capital >= Spieler.TABLE_MIN, bet, 0.0)
+
+
+#Action policies: decide(total, soft, up, first_two, pair_value) -> array of action codes.
+#first_two marks hands with their first two cards (double and surrender allowed), pair_value is the value of a
+#splittable pair or 0.
+class TableStrategy:
+    def __init__(self, first_two, later, split):
+        self.first_two = first_two #[soft, total, up] -> action for two-card hands
+        self.later = later #[soft, total, up] -> HIT or STAND
+        self.split = split #[pair value, up] -> True if the pair should be split
+
+    def decide(self, total, soft, up, first_two, pair_value):
+        soft_index = soft.astype(np.intp)
+        total = np.minimum(total, 21)
+        action = np.where(first_two, self.first_two[soft_index, total, up], self.later[soft_index, total, up])
+        return np.where((pair_value > 0) & self.split[pair_value, up], SPLIT, action)
+
+    @classmethod
+    def from_engine(cls, num_decks=None):
+        #basic strategy table of the local strategy engine (Spieler.basic_strategy) as arrays
+        table = Spieler.basic_strategy(num_decks)
+        first_two = np.array([[[ACTION_CODES[action] for action in row] for row in rows] for rows in table.first_two], dtype=np.int8)
+        later = np.array([[[ACTION_CODES[action] for action in row] for row in rows] for rows in table.later], dtype=np.int8)
+        split = np.array(table.split, dtype=bool)
+        return cls(first_two, later, split)
+
+
+class DealerMimic:
+    #plays like the croupier: hit below 17, never double, split or surrender
+    def decide(self, total, soft, up, first_two, pair_value):
+        return np.where(total < 17, HIT, STAND)
+
+
+class Simulator:
+    def __init__(self, players, num_decks, seed=None):
+        self.rng = np.random.default_rng(seed)
+        counts = Spieler.full_shoe(num_decks)
+        self.base_shoe = np.repeat(np.arange(2, 12, dtype=np.int8), counts)
+        self.shoe_size = len(self.base_shoe)
+        self.reshuffle_at = min(int(self.shoe_size * PENETRATION), self.shoe_size - MAX_CARDS_PER_ROUND)
+        self.shoes = np.empty((players, self.shoe_size), dtype=np.int8)
+        self.running_counts = np.empty((players, self.shoe_size + 1), dtype=np.int16)
+        self.pos = np.zeros(players, dtype=np.intp)
+        self._shuffle(np.arange(players))
+
+    def _shuffle(self, rows):
+        self.shoes[rows] = self.rng.permuted(np.broadcast_to(self.base_shoe, (len(rows), self.shoe_size)), axis=1)
+        self.running_counts[rows, 0] = 0
+        self.running_counts[rows, 1:] = np.cumsum(HI_LO_BY_VALUE[self.shoes[rows]], axis=1)
+        self.pos[rows] = 0
+
+    def true_counts(self):
+        rows = np.arange(len(self.pos))
+        decks_left = np.maximum((self.shoe_size - self.pos) / 52, 0.5)
+        return self.running_counts[rows, self.pos] / decks_left
+
+    def _draw(self, rows):
+        cards = self.shoes[rows, self.pos[rows]].astype(np.int16)
+        self.pos[rows] += 1
+        return cards
+
+    #plays one round for every row with a bet > 0, returns the result in units of the bet
+    def play_round(self, bets, policy, hits_soft_17):
+        reshuffle = np.nonzero(self.pos >= self.reshuffle_at)[0]
+        if len(reshuffle):
+            self._shuffle(reshuffle)
+        result = np.zeros(len(bets))
+        rows = np.nonzero(bets > 0)[0]
+        if not len(rows):
+            return result
+
+        first = self._draw(rows)
+        up = self._draw(rows)
+        second = self._draw(rows)
+        hole = self._draw(rows)
+        zeros = np.zeros(len(rows), dtype=np.int16)
+        no = np.zeros(len(rows), dtype=bool)
+        total, soft = _add_cards(*_add_cards(zeros, no, first), second)
+        dealer_total, dealer_soft = _add_cards(*_add_cards(zeros, no, up), hole)
+        player_blackjack = total == 21
+        dealer_blackjack = dealer_total == 21
+
+        result[rows[player_blackjack]] = np.where(dealer_blackjack[player_blackjack], 0.0, Spieler.BLACKJACK_PAYOUT)
+
+        #first decision with two cards
+        playing = ~player_blackjack
+        pair_value = np.where(first == second, first, 0)
+        action = policy.decide(total, soft, up, np.ones(len(rows), dtype=bool), pair_value)
+        surrender = playing & (action == SURRENDER)
+        result[rows[surrender]] = -0.5
+        playing &= ~surrender
+
+        #hands: one entry per played hand, split rows get two entries with one pair card each
+        split = playing & (action == SPLIT)
+        single = playing & ~split
+        hand_row = np.concatenate((np.nonzero(single)[0], np.nonzero(split)[0], np.nonzero(split)[0]))
+        hand_total = np.concatenate((total[single], first[split], first[split]))
+        hand_soft = np.concatenate((soft[single], first[split] == 11, first[split] == 11))
+        from_split = np.concatenate((np.zeros(single.sum(), dtype=bool), np.ones(2 * split.sum(), dtype=bool)))
+        first_action = np.concatenate((action[single], np.full(2 * split.sum(), HIT, dtype=action.dtype)))
+        if split.any():
+            split_hands = np.nonzero(from_split)[0]
+            hand_total[split_hands], hand_soft[split_hands] = _add_cards(hand_total[split_hands], hand_soft[split_hands], self._draw(rows[hand_row[split_hands]]))
+        stake = np.ones(len(hand_row))
+        done = (from_split & (first[hand_row] == 11)) | (hand_total >= 21) #split aces get one card only
+
+        #doubles take exactly one card
+        double = ~done & ~from_split & (first_action == DOUBLE_DOWN)
+        if double.any():
+            doubled = np.nonzero(double)[0]
+            hand_total[doubled], hand_soft[doubled] = _add_cards(hand_total[doubled], hand_soft[doubled], self._draw(rows[hand_row[doubled]]))
+            stake[doubled] = 2.0
+            done |= double
+        done |= ~from_split & (first_action == STAND)
+        #the first hit of unsplit hands was already decided above
+        hit_now = ~done & ~from_split & (first_action == HIT)
+        if hit_now.any():
+            hitting = np.nonzero(hit_now)[0]
+            hand_total[hitting], hand_soft[hitting] = _add_cards(hand_total[hitting], hand_soft[hitting], self._draw(rows[hand_row[hitting]]))
+            done |= hand_total >= 21
+
+        while not done.all():
+            open_hands = np.nonzero(~done)[0]
+            decision = policy.decide(hand_total[open_hands], hand_soft[open_hands], up[hand_row[open_hands]],
+                                     np.zeros(len(open_hands), dtype=bool), np.zeros(len(open_hands), dtype=np.int16))
+            done[open_hands[decision != HIT]] = True
+            hitting = open_hands[decision == HIT]
+            if len(hitting):
+                hand_total[hitting], hand_soft[hitting] = _add_cards(hand_total[hitting], hand_soft[hitting], self._draw(rows[hand_row[hitting]]))
+                done[hitting] = hand_total[hitting] >= 21
+
+        #the dealer only draws for rows with at least one hand that is not bust
+        live = np.zeros(len(rows), dtype=bool)
+        live[hand_row[hand_total <= 21]] = True
+        while True:
+            drawing = live & ~dealer_blackjack & ((dealer_total < 17) | ((dealer_total == 17) & dealer_soft & hits_soft_17))
+            if not drawing.any():
+                break
+            dealer_rows = np.nonzero(drawing)[0]
+            dealer_total[dealer_rows], dealer_soft[dealer_rows] = _add_cards(dealer_total[dealer_rows], dealer_soft[dealer_rows], self._draw(rows[dealer_rows]))
+
+        final_dealer = dealer_total[hand_row]
+        outcome = np.where(hand_total > 21, -1.0,
+                  np.where(dealer_blackjack[hand_row], -1.0,
+                  np.where(final_dealer > 21, 1.0, np.sign(hand_total - final_dealer).astype(float))))
+        np.add.at(result, rows[hand_row], outcome * stake)
+        return result
+
+
+#runs players independent bankrolls for rounds rounds and returns the summed statistics
+def simulate_chunk(players, rounds, initial_capital, bet_policy, action_policy, num_decks, hits_soft_17, seed):
+    simulator = Simulator(players, num_decks, seed)
+    capital = np.full(players, float(initial_capital))
+    hands = 0
+    units_sum = 0.0
+    units_square_sum = 0.0
+    money_sum = 0.0
+    wagered = 0.0
+    for _ in range(rounds):
+        bets = bet_policy.bets(capital, simulator.true_counts())
+        units = simulator.play_round(bets, action_policy, hits_soft_17)
+        played = bets > 0
+        hands += int(played.sum())
+        units_sum += float(units[played].sum())
+        units_square_sum += float((units[played] ** 2).sum())
+        money = bets * units
+        money_sum += float(money.sum())
+        wagered += float(bets.sum())
+        capital += money
+    ruined = int((bet_policy.bets(capital, np.zeros(players)) <= 0).sum())
+    return {"players": players, "hands": hands, "units_sum": units_sum, "units_square_sum": units_square_sum,
+            "money_sum": money_sum, "wagered": wagered, "ruined": ruined, "final_capital_sum": float(capital.sum())}
+
+
+def run_simulation(players, rounds, initial_capital, bet_policy, action_policy, num_decks=None, hits_soft_17=None,
+                   workers=1, seed=None):
+    num_decks = num_decks or Spieler.NUM_DECKS
+    hits_soft_17 = Spieler.DEALER_HITS_SOFT_17 if hits_soft_17 is None else hits_soft_17
+    seeds = np.random.SeedSequence(seed).spawn(max(1, workers))
+    chunks = [players // len(seeds) + (1 if i < players % len(seeds) else 0) for i in range(len(seeds))]
+    jobs = [(chunk, rounds, initial_capital, bet_policy, action_policy, num_decks, hits_soft_17, chunk_seed)
+            for chunk, chunk_seed in zip(chunks, seeds) if chunk]
+
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(simulate_chunk, *zip(*jobs)))
+    else:
+        parts = [simulate_chunk(*job) for job in jobs]
+
+    totals = {key: sum(part[key] for part in parts) for key in parts[0]}
+    hands = max(totals["hands"], 1)
+    ev = totals["units_sum"] / hands
+    variance = totals["units_square_sum"] / hands - ev ** 2
+    return {
+        "hands": totals["hands"],
+        "ev_per_hand": ev, #in units of the bet
+        "variance_per_hand": variance,
+        "standard_error": (variance / hands) ** 0.5,
+        "profit_per_round": totals["money_sum"] / (players * rounds),
+        "return_on_wagered": totals["money_sum"] / totals["wagered"] if totals["wagered"] else 0.0,
+        "risk_of_ruin": totals["ruined"] / players,
+        "mean_final_capital": totals["final_capital_sum"] / players,
+    }
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Monte-Carlo-Simulation von Einsatz- und Spielstrategien")
+    parser.add_argument("--players", type=int, default=10000, help="Anzahl unabhängiger Spieler (Zeilen)")
+    parser.add_argument("--rounds", type=int, default=100, help="Runden pro Spieler")
+    parser.add_argument("--capital", type=int, default=1000, help="Startkapital (INITIAL_CAPITAL)")
+    parser.add_argument("--decks", type=int, default=Spieler.NUM_DECKS, help="Anzahl Kartendecks")
+    parser.add_argument("--h17", action="store_true", help="Croupier zieht auf Soft 17")
+    parser.add_argument("--bet", choices=("kelly", "flat"), default="kelly", help="Einsatzstrategie")
+    parser.add_argument("--flat-amount", type=int, default=Spieler.TABLE_MIN, help="Einsatz für --bet flat")
+    parser.add_argument("--strategy", choices=("basic", "dealer"), default="basic", help="Spielstrategie")
+    parser.add_argument("--workers", type=int, default=1, help="Anzahl Prozesse")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args(sys.argv[1:])
+    Spieler.NUM_DECKS = args.decks
+    Spieler.DEALER_HITS_SOFT_17 = args.h17
+
+    bet_policy = KellyBet() if args.bet == "kelly" else FlatBet(args.flat_amount)
+    action_policy = TableStrategy.from_engine(args.decks) if args.strategy == "basic" else DealerMimic()
+
+    started = time.perf_counter()
+    result = run_simulation(args.players, args.rounds, args.capital, bet_policy, action_policy, args.decks, args.h17,
+                            args.workers, args.seed)
+    elapsed = time.perf_counter() - started
+
+    print(f"Hände: {result['hands']} in {elapsed:.1f} s ({result['hands'] / elapsed * 60:,.0f} Hände/min)")
+    print(f"EV pro Hand: {result['ev_per_hand']:+.4%} (± {result['standard_error']:.4%}), Varianz: {result['variance_per_hand']:.3f}")
+    print(f"Gewinn pro Runde: {result['profit_per_round']:+.3f}, Rendite auf Einsätze: {result['return_on_wagered']:+.4%}")
+    print(f"Risk of Ruin nach {args.rounds} Runden mit Startkapital {args.capital}: {result['risk_of_ruin']:.2%}")
+    print(f"Durchschnittliches Endkapital: {result['mean_final_capital']:.2f}")
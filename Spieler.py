@@ -3,7 +3,17 @@ import json
 import random
 import sys
 import uuid
+import struct
+import os
 import time 
+import functools
+import asyncio
+import threading
+import queue
+import array
+import argparse
+import collections
+import itertools
 
 #addresses
 PLAYER_IP = ''
@@ -15,66 +25,405 @@ COUNTER_PORT = 0
 INITIAL_CAPITAL = 0
 
 #global variables
-player_id = ""
-nickname = ""
-player_hand = []
-player_capital = INITIAL_CAPITAL
-current_bet = 0
-game_in_progress = False
-dealer_up_card = None #Stores the dealer's visible card
-recommended_action = None
-player_turn_active = False
-is_betting_phase = True
+sessions = {} #player_id -> PlayerSession, one session per seat played from this process
+_recommendation_requests = collections.OrderedDict() #request_id -> session, open recommendation_requests in the order they were sent
+
+#bot mode
+REPORT_INTERVAL = 5 #seconds between the aggregated bot reports
+
+#Shared bankroll of the supervisor (Supervisor.py), None means every seat only stakes its own player_capital.
+#The object offers available, reserved, seats, join(), leave(), reserve(amount) -> bool and settle(reserved, payout),
+#stakes are reserved before the bet or double/split is sent and settled with the net payout of game_result, so seats in
+#other processes can't overspend it. Every playing seat has joined, a seat sizes its bets against its equal share of
+#the bankroll, so the seats together don't bet more than one Kelly fraction of it.
+bankroll = None
+BANKROLL_RETRY = 0.05 #seconds until an automatic seat tries again when the shared bankroll is reserved by other seats
 
 #Socket
 sock = None #Will be initialized in __main__
+transport = None #asyncio transport on top of sock, used for sending
+
+#Event log
+#Events are (name, fields). Disabled levels return before anything is queued, hot paths additionally check
+#log.debug_on / log.info_on before building the fields. A background thread renders and writes the queue in batches,
+#either as the German console output or as JSON lines.
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LOG_LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LOG_BATCH_SIZE = 256
+
+class EventLog:
+    def __init__(self, level=INFO, stream=None, json_lines=False):
+        self.stream = stream
+        self.json_lines = json_lines
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self.set_level(level)
+
+    def set_level(self, level):
+        self.level = level
+        self.debug_on = level <= DEBUG
+        self.info_on = level <= INFO
+
+    def _emit(self, level, event, fields):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_batches, daemon=True)
+            self._writer.start()
+        self._queue.put((time.time(), level, event, fields))
+
+    def debug(self, event, **fields):
+        if self.debug_on:
+            self._emit(DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        if self.info_on:
+            self._emit(INFO, event, fields)
+
+    def warning(self, event, **fields):
+        if self.level <= WARNING:
+            self._emit(WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._emit(ERROR, event, fields)
+
+    #waits until everything queued so far is written (e.g. before printing a prompt)
+    def flush(self, timeout=1.0):
+        if self._writer is not None:
+            written = threading.Event()
+            self._queue.put(written)
+            written.wait(timeout)
+
+    def _write_batches(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < LOG_BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            lines = []
+            markers = []
+            for entry in batch:
+                if isinstance(entry, threading.Event):
+                    markers.append(entry)
+                else:
+                    lines.append(self._render(*entry))
+            if lines:
+                stream = self.stream or sys.stdout
+                try:
+                    stream.write("".join(lines))
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+            for marker in markers:
+                marker.set()
+
+    def _render(self, timestamp, level, event, fields):
+        if self.json_lines:
+            record = {"ts": round(timestamp, 6), "level": _LEVEL_NAMES[level], "event": event}
+            record.update(fields)
+            return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        return render_console(event, fields) + "\n"
+
+_LEVEL_NAMES = {level: name for name, level in LOG_LEVELS.items()}
+
+def _render_game_update(fields):
+    hands = fields["hands"]
+    lines = ["\n--- Spiel-Update ---"]
+    for i, (cards, total) in enumerate(zip(hands, fields["totals"])):
+        number = f" {i + 1}" if len(hands) > 1 else ""
+        marker = " <-" if len(hands) > 1 and i == fields["active"] else ""
+        lines.append(f"Deine Hand{number}: {cards} (Wert: {total}){marker}")
+    lines.append(f"Croupier's Hand: {' '.join('[HIDDEN]' if s == 'HIDDEN' else s for s in fields['dealer'])}")
+    lines.append(f"Dein Kapital: {fields['capital']}")
+    return "\n".join(lines)
+
+def _render_turn_prompt(fields):
+    lines = [f"\n--- Dein Zug ({fields['player']}) ---", f"Deine Hand: {fields['hand']} (Wert: {fields['total']})"]
+    if fields["up_card"]:
+        lines.append(f"Croupier's sichtbare Karte: {fields['up_card']}")
+    if fields.get("dealer"):
+        lines.append("Croupier endet mit: " + ", ".join(f"{outcome}: {p:.0%}" for outcome, p in zip(_DEALER_OUTCOME_NAMES, fields["dealer"])))
+    lines.append("Verfügbare Aktionen: H (Hit), S (Stand), D (Double Down), P (Split), SURRENDER, AUTO")
+    if fields["recommendation"]:
+        lines.append(f"Empfohlene Aktion: {fields['recommendation']}. Mit 'AUTO' ausführen.")
+    return "\n".join(lines)
+
+_DEALER_OUTCOME_NAMES = ("17", "18", "19", "20", "21", "Bust", "BJ")
+
+def _render_dealer_outcomes(fields):
+    lines = [f"Croupier-Ausgänge ({fields['rule']}, Schuh mit {fields['remaining']} Karten):",
+             "  Karte " + " ".join(f"{name:>6}" for name in _DEALER_OUTCOME_NAMES)]
+    for up_value, probabilities in fields["table"].items():
+        lines.append(f"  {'A' if up_value == 11 else up_value:>5} " + " ".join(f"{p:>6.1%}" for p in probabilities))
+    return "\n".join(lines)
+
+#German console output, one template (format string or function of the fields) per event
+CONSOLE_TEMPLATES = {
+    "sent": "-> Sent to {ip}:{port}: {type} {payload}",
+    "send_failed": "Fehler beim Senden der UDP-Nachricht an {ip}:{port}: {error}",
+    "delivery_failed": "Nachricht {seq} an {ip}:{port} nach {retries} Wiederholungen nicht bestätigt.",
+    "invalid_seq": "Nachricht von {ip}:{port} mit ungültiger Sequenznummer oder Epoche {seq} verworfen.",
+    "peer_restarted": "{ip}:{port} wurde neu gestartet, die Sequenznummern beginnen wieder bei 0.",
+    "deadline_fallback": "{player}: Keine Empfehlung nach {deadline} s, spiele Basisstrategie: {action}",
+    "peer_rejected": "Pakete von unbekanntem Absender {ip}:{port} werden verworfen (nur Croupier und Kartenzähler).",
+    "datagram_truncated": "Paket von {ip}:{port} ist größer als {size} Bytes und wurde verworfen.",
+    "metrics_dump_failed": "Fehler beim Schreiben der Metriken nach {path}: {error}",
+    "journal_write_failed": "Fehler beim Schreiben des Journals nach {path}: {error}",
+    "journal_truncated": "Journal {path}: unvollständiger letzter Eintrag ({size} Bytes) verworfen.",
+    "session_restored": "{player}: Zustand aus dem Journal wiederhergestellt, Kapital {capital}, {rounds} Runden.",
+    "received": "<- Received from {ip}:{port}: {type} {payload}",
+    "unknown_message": "Unbekannter Nachrichtentyp empfangen: {type}",
+    "invalid_message": "Ungültige Nachricht {type} von {ip}:{port} verworfen: {error}",
+    "json_decode_failed": "Fehler beim Dekodieren der JSON-Nachricht von {ip}:{port}: {data}",
+    "binary_decode_failed": "Fehler beim Dekodieren der Binärnachricht von {ip}:{port}: {error}",
+    "handler_failed": "Ein Fehler beim Verarbeiten der Nachricht ist aufgetreten: {error}",
+    "receive_error": "Ein Fehler im Empfang ist aufgetreten: {error}",
+    "receive_failed": "Paket von {ip}:{port} konnte nicht verarbeitet werden: {error}",
+    "no_capital": "Kein Kapital mehr übrig. Spiel beendet.",
+    "bet_calculated": "Berechne optimalen Einsatz: {amount} (True Count {true_count:+.1f}, Vorteil {edge:+.2%})",
+    "dealer_outcomes": _render_dealer_outcomes,
+    "shoe_state": "Schuh: {remaining} Karten übrig, Running Count {running_count:+d}, True Count {true_count:+.1f}, Vorteil {edge:+.2%}",
+    "round_started": "\n--- Neues Spiel gestartet ---\nDeine Hand: {hand} (Wert: {total})\nCroupier's sichtbare Karte: {up_card}\n"
+                     "Dein Einsatz: {bet}\nDein Kapital: {capital}",
+    "blackjack": "BLACKJACK! Warte auf Rundenergebnis.",
+    "bust_at_start": "Busted at start! Warte auf Rundenergebnis.",
+    "game_update": _render_game_update,
+    "your_turn": "\n--- Dein Zug ({player}) ---",
+    "no_actions": "Handwert ist {total}. Keine weiteren Aktionen möglich.",
+    "other_turn": "Es ist der Zug von Spieler: {turn}",
+    "recommendation": lambda f: f"<- {f['source']}: Empfehlung erhalten: {f['action']} (EV: {'-' if f['ev'] is None else format(f['ev'], '.2f')})",
+    "round_result": lambda f: (f"Rundenergebnis für {f['player']}: {f['result'].upper()}!\n"
+                               f"Deine Endhand: {f['hand']} (Wert: {f['total']})\n"
+                               f"Croupier's Endhand: {f['dealer_hand']} (Wert: {f['dealer_total']})\n"
+                               f"Auszahlung: {f['payout']}, Neues Kapital: {f['capital']}"),
+    "capital_exhausted": "Kapital aufgebraucht. Spiel beendet.",
+    "round_finished": "--- Spiel beendet. Aktuelles Kapital: {capital} ---\n",
+    "ready_for_round": "\nBereit für neue Runde. Platziere Einsatz (oder drücke 'q' zum Beenden).",
+    "statistics": lambda f: f"Statistiken vom Kartenzähler erhalten: {json.dumps(f['statistics'], indent=2)}",
+    "bet_rejected": "Croupier hat den Einsatz abgelehnt: {reason}",
+    "bets_rejected": "{player}: {count} Einsätze nacheinander abgelehnt, automatisches Spiel beendet.",
+    "insufficient_capital": "Nicht genug Kapital für Einsatz von {amount}. Verfügbar: {capital}",
+    "bet_placed": "{player} platziert Einsatz von {amount}. Warte auf Start der Runde...",
+    "turn_prompt": _render_turn_prompt,
+    "no_recommendation": "Keine ausstehende Empfehlung, um 'auto' auszuführen.",
+    "auto_action": "Führe empfohlene Aktion für {player} aus: {action}",
+    "double_not_possible": "Double Down ist nur mit 2 Karten und ausreichend Kapital möglich.",
+    "split_not_possible": "Split ist nur mit zwei Karten des gleichen Rangs und ausreichend Kapital möglich.",
+    "invalid_action": "Ungültige Aktion. Bitte wähle erneut.",
+}
+
+def render_console(event, fields):
+    template = CONSOLE_TEMPLATES.get(event)
+    try:
+        if callable(template):
+            return template(fields)
+        if template is not None:
+            return template.format(**fields)
+    except (KeyError, IndexError, TypeError, ValueError):
+        pass
+    return f"{event} {fields}"
+
+log = EventLog()
+
+
+#Metrics
+#Counters and latency histograms that are cheap enough for every datagram: recording is an index computation and an
+#array increment, the percentiles are only computed for the 'metrics' command and the periodic dump (--metrics-file).
+#Histograms are HDR-style: values in microseconds, exact below 2**HISTOGRAM_PRECISION_BITS, above that every power of
+#two is split into the same number of linear sub-buckets (relative error < 1/2**(HISTOGRAM_PRECISION_BITS-1)).
+HISTOGRAM_PRECISION_BITS = 7
+HISTOGRAM_MAX_US = 60_000_000 #larger values are counted in the last bucket
+METRICS_INTERVAL = 10 #seconds between two dumps to the metrics file
+
+class LatencyHistogram:
+    __slots__ = ('counts', 'count', 'total_us', 'max_us')
+    _half = 1 << (HISTOGRAM_PRECISION_BITS - 1)
+
+    def __init__(self):
+        self.counts = array.array('Q', bytes(8 * (self._index(HISTOGRAM_MAX_US) + 1)))
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def _index(cls, value_us):
+        exponent = value_us.bit_length() - HISTOGRAM_PRECISION_BITS
+        if exponent <= 0:
+            return value_us
+        return (exponent + 1) * cls._half + (value_us >> exponent) - cls._half
+
+    @classmethod
+    def _value(cls, index):
+        #middle of the bucket
+        if index < 2 * cls._half:
+            return index
+        exponent = index // cls._half - 1
+        return ((index % cls._half + cls._half) << exponent) + (1 << exponent) // 2
+
+    def record(self, seconds):
+        value_us = min(max(int(seconds * 1_000_000), 0), HISTOGRAM_MAX_US)
+        self.counts[self._index(value_us)] += 1
+        self.count += 1
+        self.total_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0
+        rank = max(1, int(fraction * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._value(index), self.max_us)
+        return self.max_us
+
+    def summary(self):
+        return {"count": self.count, "mean_ms": self.total_us / self.count / 1000 if self.count else 0.0,
+                "p50_ms": self.percentile(0.5) / 1000, "p90_ms": self.percentile(0.9) / 1000,
+                "p99_ms": self.percentile(0.99) / 1000, "max_ms": self.max_us / 1000}
+
+class Metrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters = collections.Counter()
+        self.histograms = collections.defaultdict(LatencyHistogram)
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def record(self, name, seconds):
+        self.histograms[name].record(seconds)
+
+    def snapshot(self):
+        counters = dict(self.counters)
+        counters["handled"] = {msg_type: handled for msg_type, (handled, _) in message_counters.items()}
+        counters["rejected"] = {msg_type: rejected for msg_type, (_, rejected) in message_counters.items() if rejected}
+        if impairment is not None:
+            counters["impairment_dropped"] = impairment.dropped
+        if RELIABLE:
+            counters["retransmissions"] = reliable_delivery.retransmissions
+            counters["duplicates"] = reliable_delivery.duplicates
+            counters["delivery_failures"] = reliable_delivery.failures
+            counters["skipped_gaps"] = reliable_delivery.skipped_gaps
+            counters["late_deliveries"] = reliable_delivery.late
+            counters["invalid_seq"] = reliable_delivery.invalid
+            counters["stale_epoch"] = reliable_delivery.stale
+            counters["peer_restarts"] = reliable_delivery.peer_restarts
+        return {"ts": round(time.time(), 3), "uptime_s": round(time.time() - self.started_at, 3), "counters": counters,
+                "histograms": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}}
+
+    def render(self):
+        snapshot = self.snapshot()
+        lines = [f"--- Metriken (seit {snapshot['uptime_s']:.0f} s) ---"]
+        for name, value in sorted(snapshot["counters"].items()):
+            if isinstance(value, dict):
+                value = ", ".join(f"{key}={count}" for key, count in sorted(value.items(), key=str)) or "-"
+            lines.append(f"  {name}: {value}")
+        lines.append(f"  {'Latenz':<40} {'Anzahl':>8} {'Ø ms':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name, summary in snapshot["histograms"].items():
+            lines.append(f"  {name:<40} {summary['count']:>8} {summary['mean_ms']:>8.3f} {summary['p50_ms']:>8.3f} "
+                         f"{summary['p90_ms']:>8.3f} {summary['p99_ms']:>8.3f} {summary['max_ms']:>8.3f}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.snapshot(), default=str) + "\n")
+
+metrics = Metrics()
+metrics_file = None #--metrics-file, one JSON line per METRICS_INTERVAL
+
+async def _dump_metrics_periodically():
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        try:
+            metrics.dump(metrics_file)
+        except OSError as e:
+            log.error("metrics_dump_failed", path=metrics_file, error=str(e))
+
+
+SUITS = ('S', 'C', 'H', 'D')
+RANKS = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+#German names for initial compatibility
+SUIT_ALIASES = {'Kreuz': 'C', 'Pik': 'S', 'Herz': 'H', 'Karo': 'D'}
+RANK_ALIASES = {'Bube': 'J', 'Dame': 'Q', 'König': 'K', 'Ass': 'A'}
 
 class Card:
-    def __init__(self, suit, rank):
+    #Cards are immutable and interned: there is exactly one instance per suit and rank,
+    #so parsing a card from a message is a dict lookup and cards can be compared by identity.
+    __slots__ = ('suit', 'rank', 'value', 'code', '_str')
+    _interned = {} #(suit, rank) -> Card, including the German aliases
+
+    def __new__(cls, suit, rank):
         #Suits and ranks should match what the Croupier and Counter expect
         #Assuming suits are 'S', 'C', 'H', 'D' and ranks are '2'-'10', 'J', 'Q', 'K', 'A'
-        if suit not in ['S', 'C', 'H', 'D', 'Kreuz', 'Pik', 'Herz', 'Karo']: #Allow German suits for initial compatibility
+        try:
+            return cls._interned[(suit, rank)]
+        except (KeyError, TypeError):
+            pass
+        if SUIT_ALIASES.get(suit, suit) not in SUITS:
             raise ValueError(f"Ungültiger Kartentyp (Suit): {suit}. Muss 'S', 'C', 'H', 'D' oder Deutsch sein.")
-        if rank not in ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A', 'Bube', 'Dame', 'König', 'Ass']: #Allow German ranks
-            raise ValueError(f"Ungültiger Kartenrang (Rank): {rank}.")
+        raise ValueError(f"Ungültiger Kartenrang (Rank): {rank}.")
 
-        self.suit = self._map_suit_to_short(suit)
-        self.rank = self._map_rank_to_short(rank)
+    @classmethod
+    def _create(cls, suit, rank):
+        card = object.__new__(cls)
+        object.__setattr__(card, 'suit', suit)
+        object.__setattr__(card, 'rank', rank)
+        object.__setattr__(card, 'value', 11 if rank == 'A' else 10 if rank in ('J', 'Q', 'K') else int(rank))
+        object.__setattr__(card, 'code', SUITS.index(suit) * 16 + RANKS.index(rank)) #fits into one byte
+        object.__setattr__(card, '_str', f"{suit}{rank}")
+        return card
 
-    def _map_suit_to_short(self, suit):
-        #Maps German suit names to single letters if necessary
-        mapping = {'Kreuz': 'C', 'Pik': 'S', 'Herz': 'H', 'Karo': 'D'}
-        return mapping.get(suit, suit)
+    def __setattr__(self, name, value):
+        raise AttributeError("Card ist unveränderlich.")
 
-    def _map_rank_to_short(self, rank):
-        #Maps German rank names to single letters/numbers if necessary
-        mapping = {'Bube': 'J', 'Dame': 'Q', 'König': 'K', 'Ass': 'A'}
-        return mapping.get(rank, rank)
+    def __reduce__(self):
+        return (Card, (self.suit, self.rank))
 
     def __str__(self):
-        return f"{self.suit}{self.rank}"
+        return self._str
 
     def __repr__(self):
         return f"Card('{self.suit}', '{self.rank}')"
 
     def get_value(self):
-        if self.rank in ['J', 'Q', 'K']:
-            return 10
-        elif self.rank == 'A':
-            return 11
-        else:
-            return int(self.rank)
+        return self.value
 
     def to_json(self):
-        return str(self)
+        return self._str
+
+def _intern_cards():
+    suit_names = {short: [short] for short in SUITS}
+    rank_names = {short: [short] for short in RANKS}
+    for alias, short in SUIT_ALIASES.items():
+        suit_names[short].append(alias)
+    for alias, short in RANK_ALIASES.items():
+        rank_names[short].append(alias)
+
+    by_code = {}
+    by_str = {}
+    for suit in SUITS:
+        for rank in RANKS:
+            card = Card._create(suit, rank)
+            by_code[card.code] = card
+            for suit_name in suit_names[suit]:
+                for rank_name in rank_names[rank]:
+                    Card._interned[(suit_name, rank_name)] = card
+                    by_str[suit_name + rank_name] = card
+    return by_code, by_str
+
+CARDS_BY_CODE, _CARDS_BY_STR = _intern_cards()
 
 def _card_from_str(card_str):
     if card_str is None or card_str == "HIDDEN":
         return None
     #Assuming card_str format is "SUITRANK" e.g., "S10", "HA"
-    suit = card_str[0]
-    rank = card_str[1:]
-    return Card(suit, rank)
+    try:
+        return _CARDS_BY_STR[card_str]
+    except KeyError:
+        return Card(card_str[:1], card_str[1:]) #raises the ValueError with the reason
 
 def _card_from_dict(card_dict):
     if not isinstance(card_dict, dict) or 'suit' not in card_dict or 'rank' not in card_dict:
@@ -103,291 +452,2146 @@ def calculate_hand_value(hand):
         num_aces -= 1
     return value
 
-#General function to send UDP messages
-def _send_udp_message(target_ip, target_port, message_dict):
-    global sock
-    try:
-        message_json = json.dumps(message_dict).encode('utf-8')
-        sock.sendto(message_json, (target_ip, target_port))
-        print(f"-> Sent to {target_ip}:{target_port}: {message_dict.get('type')} {message_dict.get('payload', '')}")
-    except Exception as e:
-        print(f"Fehler beim Senden der UDP-Nachricht an {target_ip}:{target_port}: {e}")
-
-#requests a recommendation from counter
-def request_recommendation_from_counter():
-    global recommended_action
-
-    player_hand_str = [c.to_json() for c in player_hand]
-    dealer_up_card_str = dealer_up_card.to_json() if dealer_up_card else None
-
-    recommendation_request_message = {
-        "type": "recommendation_request",
-        "payload": {
-            "player_id": player_id,
-            "player_hand": player_hand_str,
-            "dealer_up_card": dealer_up_card_str,
-            "player_listen_addr": [PLAYER_IP, PLAYER_PORT]
-        }
-    }
-    _send_udp_message(COUNTER_IP, COUNTER_PORT, recommendation_request_message)
 
-#calculates the optimal bet amount
-def determine_optimal_bet():
-    global player_capital
-    if player_capital <= 0:
-        print("Kein Kapital mehr übrig. Spiel beendet.")
-        return 0
+#Incrementally evaluated hand
+class HandState:
+    #Keeps total, soft aces and the flags up to date as cards are added, so evaluating a hand is O(1) per card
+    __slots__ = ('cards', 'total', 'soft_aces', 'is_pair', 'is_blackjack', 'is_bust')
+
+    def __init__(self, cards=()):
+        self.cards = []
+        self.total = 0
+        self.soft_aces = 0 #aces that are currently counted as 11
+        self.is_pair = False
+        self.is_blackjack = False
+        self.is_bust = False
+        for card in cards:
+            self.add(card)
+
+    def add(self, card):
+        if card is None: #Handle potential HIDDEN cards
+            return
+        cards = self.cards
+        cards.append(card)
+        self.total += card.value
+        if card.value == 11:
+            self.soft_aces += 1
+        while self.total > 21 and self.soft_aces:
+            self.total -= 10
+            self.soft_aces -= 1
+        self.is_pair = len(cards) == 2 and cards[0].rank == cards[1].rank
+        self.is_blackjack = len(cards) == 2 and self.total == 21
+        self.is_bust = self.total > 21
+
+    def sync(self, cards):
+        #updates the hand from the full card list of a message, only new cards are evaluated
+        known = self.cards
+        if len(cards) < len(known) or any(a is not b for a, b in zip(known, cards)):
+            self.__init__(cards)
+            return
+        for card in cards[len(known):]:
+            self.add(card)
+
+    @property
+    def soft(self):
+        return self.soft_aces > 0
+
+    @property
+    def card_count(self):
+        return len(self.cards)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
 
-    bet_amount = min(player_capital, 50) #bet maximum 50 or (if total is lower) all remaining capital
-    print(f"Berechne optimalen Einsatz: {bet_amount}")
-    return bet_amount
+    def __str__(self):
+        return f"{[str(c) for c in self.cards]} (Wert: {self.total})"
+
+def _hands_from_payload(hands, hand_strings):
+    #syncs the list of HandStates of a seat with the hands from a message
+    del hands[len(hand_strings):]
+    for i, card_strings in enumerate(hand_strings):
+        cards = [c for c in (_card_from_str(s) for s in card_strings) if c is not None]
+        if i < len(hands):
+            hands[i].sync(cards)
+        else:
+            hands.append(HandState(cards))
+    return hands
+
+
+#Strategy engine
+#A shoe composition is a tuple of 10 counts: index 0-8 for the values 2-10 (J, Q, K count as 10), index 9 for the ace
+NUM_DECKS = 6 #Assumed number of decks in the croupier's shoe
+MAX_DECKS = 8 #the croupier plays with 1-8 decks
+DEALER_HITS_SOFT_17 = False
+BLACKJACK_PAYOUT = 1.5
+DEALER_OUTCOMES = (17, 18, 19, 20, 21, "BUST", "BLACKJACK")
+
+def full_shoe(num_decks=None):
+    num_decks = num_decks or NUM_DECKS
+    return tuple([4 * num_decks] * 8 + [16 * num_decks, 4 * num_decks])
+
+def _add_value(total, soft, value):
+    #adds a card value (2-11) to a total, soft means that one ace is currently counted as 11
+    total += value
+    if value == 11:
+        if soft:
+            total -= 10 #only one ace can count as 11
+        soft = True
+    if total > 21 and soft:
+        total -= 10
+        soft = False
+    return total, soft
+
+def _draw_probabilities(shoe):
+    #yields (value, probability, shoe after the draw) for every value left in the shoe
+    remaining = sum(shoe)
+    if remaining == 0:
+        shoe = full_shoe() #empty shoe, the croupier reshuffles
+        remaining = sum(shoe)
+    for index, count in enumerate(shoe):
+        if count:
+            yield index + 2, count / remaining, shoe[:index] + (count - 1,) + shoe[index + 1:]
+
+#Dealer outcome tables
+#Every way the dealer can finish after an up card is a multiset of drawn values (about 9000 per rule for all up cards),
+#enumerated once per up card and rule. Its probability for a shoe with n_v cards of value v and N cards in total is
+#  orders * prod_v ff(n_v, k_v) / ff(N, k)
+#with ff the falling factorial, k_v the drawn cards of value v, k all drawn cards and orders the number of drawing orders
+#that stop exactly with the last card. A table keeps the products and their sums per (outcome, k) for one shoe. When cards
+#leave the shoe, only the products of multisets that draw that value change (by ff(n_v - d, k_v) / ff(n_v, k_v)), so the
+#table is updated instead of recomputed. Results are cached by (shoe, up card, rule).
+DEALER_CACHE_SIZE = 4096 #cached (shoe, up card, rule) results
+DEALER_TABLES_PER_UP_CARD = 16 #shoes followed per up card and rule, every seat in the process counts its own shoe
+_DEALER_MIN_SHOE = 16 #fewer cards can't finish every dealer hand, the croupier has reshuffled long before
+
+def _falling(n, k):
+    result = 1
+    for i in range(k):
+        result *= n - i
+    return result
+
+@functools.lru_cache(maxsize=None)
+def _dealer_hands(up_value, hits_soft_17):
+    #every finished dealer hand after the up card: (drawn counts indexed like a shoe composition, cards drawn,
+    #outcome index like DEALER_OUTCOMES, number of drawing orders)
+    orders = collections.Counter()
+
+    def draw(total, soft, drawn):
+        if total > 21:
+            outcome = 5
+        elif total >= 17 and not (total == 17 and soft and hits_soft_17):
+            outcome = 6 if total == 21 and len(drawn) == 1 else total - 17
+        else:
+            for value in range(2, 12):
+                draw(*_add_value(total, soft, value), drawn + (value,))
+            return
+        counts = [0] * 10
+        for value in drawn:
+            counts[value - 2] += 1
+        orders[tuple(counts), len(drawn), outcome] += 1
+
+    draw(up_value, up_value == 11, ())
+    return tuple((counts, drawn, outcome, count) for (counts, drawn, outcome), count in orders.items())
+
+class DealerOutcomeTable:
+    def __init__(self, up_value, hits_soft_17, shoe):
+        hands = _dealer_hands(up_value, hits_soft_17)
+        self.up_value = up_value
+        self.hits_soft_17 = hits_soft_17
+        self.max_drawn = max(drawn for _, drawn, _, _ in hands)
+        self.stride = self.max_drawn + 1
+        self.counts = [counts for counts, _, _, _ in hands]
+        self.orders = [float(orders) for _, _, _, orders in hands]
+        self.groups = [outcome * self.stride + drawn for _, drawn, outcome, _ in hands]
+        self.by_value = [[(i, counts[index]) for i, counts in enumerate(self.counts) if counts[index]] for index in range(10)]
+        self.rebuild(shoe)
+
+    def copy(self):
+        table = object.__new__(DealerOutcomeTable)
+        table.__dict__.update(self.__dict__)
+        table.products = list(self.products)
+        table.sums = list(self.sums)
+        return table
+
+    def rebuild(self, shoe):
+        falling = [[_falling(n, k) for k in range(self.stride)] for n in shoe]
+        self.products = []
+        self.sums = [0.0] * (7 * self.stride)
+        for counts, orders, group in zip(self.counts, self.orders, self.groups):
+            product = 1
+            for index, k in enumerate(counts):
+                if k:
+                    product *= falling[index][k]
+            product = float(product)
+            self.products.append(product)
+            self.sums[group] += orders * product
+        self.shoe = tuple(shoe)
+        metrics.counters["dealer_table_rebuilds"] += 1
+
+    #moves the table to shoe, which has to be the table's shoe minus some cards
+    def remove(self, shoe):
+        products, sums, orders, groups = self.products, self.sums, self.orders, self.groups
+        for index, (before, after) in enumerate(zip(self.shoe, shoe)):
+            if before == after:
+                continue
+            ratios = [0.0] * self.stride
+            for k in range(1, self.stride):
+                old = _falling(before, k)
+                if old:
+                    ratios[k] = _falling(after, k) / old
+            for i, k in self.by_value[index]:
+                product = products[i]
+                if product:
+                    updated = product * ratios[k]
+                    products[i] = updated
+                    sums[groups[i]] += orders[i] * (updated - product)
+        self.shoe = tuple(shoe)
+        metrics.counters["dealer_table_updates"] += 1
+
+    #probabilities of the outcomes (indexed like DEALER_OUTCOMES) for the table's shoe
+    def probabilities(self):
+        remaining = sum(self.shoe)
+        denominators = [float(_falling(remaining, k)) for k in range(self.stride)]
+        result = [0.0] * 7
+        for group, total in enumerate(self.sums):
+            if total:
+                result[group // self.stride] += total / denominators[group % self.stride]
+        return tuple(max(p, 0.0) for p in result) #the sums of exhausted values can end a rounding error below 0
+
+class DealerOutcomes:
+    def __init__(self, cache_size=None, tables_per_up_card=None):
+        self.cache = collections.OrderedDict() #(shoe, up value, hits_soft_17) -> probabilities
+        self.cache_size = cache_size or DEALER_CACHE_SIZE
+        self.tables_per_up_card = tables_per_up_card or DEALER_TABLES_PER_UP_CARD
+        self.tables = collections.defaultdict(list) #(up value, hits_soft_17) -> DealerOutcomeTable, last used at the end
+        self.full_tables = {} #(up value, hits_soft_17, num_decks) -> table of a full shoe, never updated
+
+    #final outcome distribution of the dealer (indexed like DEALER_OUTCOMES) for an up card value (2-11) and the shoe
+    #that is left after all visible cards, with the configured rule unless hits_soft_17 is given
+    def probabilities(self, up_value, shoe, hits_soft_17=None):
+        if hits_soft_17 is None:
+            hits_soft_17 = DEALER_HITS_SOFT_17
+        if sum(shoe) < _DEALER_MIN_SHOE:
+            shoe = full_shoe()
+        key = (shoe, up_value, hits_soft_17)
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            metrics.counters["dealer_cache_hit"] += 1
+            return result
+        metrics.counters["dealer_cache_miss"] += 1
+        result = self._table(up_value, hits_soft_17, shoe).probabilities()
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    #all up cards: {up value: probabilities}
+    def table(self, shoe, hits_soft_17=None):
+        return {up_value: self.probabilities(up_value, shoe, hits_soft_17) for up_value in range(2, 12)}
+
+    def bust_probability(self, up_value, shoe, hits_soft_17=None):
+        return self.probabilities(up_value, shoe, hits_soft_17)[5]
+
+    #the table that is closest above shoe is updated. For a shoe with more cards of some value than every table (after a
+    #reshuffle) a copy of the full shoe's table replaces the least recently used one.
+    def _table(self, up_value, hits_soft_17, shoe):
+        tables = self.tables[up_value, hits_soft_17]
+        best, distance = None, None
+        for table in tables:
+            if all(after <= before for after, before in zip(shoe, table.shoe)):
+                removed = sum(table.shoe) - sum(shoe)
+                if best is None or removed < distance:
+                    best, distance = table, removed
+        if best is not None:
+            tables.remove(best)
+            if distance:
+                best.remove(shoe)
+        else:
+            if len(tables) >= self.tables_per_up_card:
+                tables.pop(0)
+            best = self._full_table(up_value, hits_soft_17, shoe)
+            if best is None:
+                best = DealerOutcomeTable(up_value, hits_soft_17, shoe)
+            elif best.shoe != shoe:
+                best.remove(shoe)
+        tables.append(best)
+        return best
+
+    #copy of the table of the smallest full shoe that holds shoe, None if no number of decks does
+    def _full_table(self, up_value, hits_soft_17, shoe):
+        num_decks = max(-(-count // full) for count, full in zip(shoe, full_shoe(1)))
+        if num_decks > MAX_DECKS:
+            return None
+        key = (up_value, hits_soft_17, num_decks)
+        if key not in self.full_tables:
+            self.full_tables[key] = DealerOutcomeTable(up_value, hits_soft_17, full_shoe(num_decks))
+        return self.full_tables[key].copy()
+
+dealer_outcomes = DealerOutcomes()
+
+def dealer_probabilities(up_value, shoe):
+    #final outcome distribution of the dealer for a visible card value (2-11) and the remaining shoe
+    return dealer_outcomes.probabilities(up_value, shoe)
+
+#The player EV functions evaluate all draws against the same shoe (the composition at decision time).
+#This keeps the memoized state small enough for a decision to be a few cache lookups.
+@functools.lru_cache(maxsize=1 << 16)
+def _stand_ev(total, up_value, shoe):
+    if total > 21:
+        return -1.0
+    dealer = dealer_probabilities(up_value, shoe)
+    ev = dealer[5] - dealer[6]
+    for i, dealer_total in enumerate(DEALER_OUTCOMES[:5]):
+        if total > dealer_total:
+            ev += dealer[i]
+        elif total < dealer_total:
+            ev -= dealer[i]
+    return ev
+
+@functools.lru_cache(maxsize=1 << 16)
+def _hit_ev(total, soft, up_value, shoe):
+    ev = 0.0
+    for value, probability, _ in _draw_probabilities(shoe):
+        next_total, next_soft = _add_value(total, soft, value)
+        if next_total > 21:
+            ev -= probability
+        else:
+            ev += probability * max(_stand_ev(next_total, up_value, shoe), _hit_ev(next_total, next_soft, up_value, shoe))
+    return ev
+
+def _double_ev(total, soft, up_value, shoe):
+    ev = 0.0
+    for value, probability, _ in _draw_probabilities(shoe):
+        next_total, _ = _add_value(total, soft, value)
+        ev += probability * _stand_ev(next_total, up_value, shoe)
+    return 2 * ev
+
+def _split_ev(pair_value, up_value, shoe):
+    #no resplitting, split aces receive exactly one card each
+    ev = 0.0
+    for value, probability, _ in _draw_probabilities(shoe):
+        total, soft = _add_value(*_add_value(0, False, pair_value), value)
+        if pair_value == 11:
+            ev += probability * _stand_ev(total, up_value, shoe)
+        else:
+            ev += probability * max(_stand_ev(total, up_value, shoe), _hit_ev(total, soft, up_value, shoe))
+    return 2 * ev
+
+def evaluate_actions(hand, up_card, shoe):
+    #expected values (in units of the bet) of all actions that are allowed for the HandState
+    total, soft = hand.total, hand.soft
+    up_value = up_card.value
+    if hand.is_blackjack:
+        return {"STAND": BLACKJACK_PAYOUT * (1 - dealer_probabilities(up_value, shoe)[6])}
+    if total >= 21:
+        return {"STAND": _stand_ev(total, up_value, shoe)}
+
+    evs = {
+        "HIT": _hit_ev(total, soft, up_value, shoe),
+        "STAND": _stand_ev(total, up_value, shoe),
+    }
+    if hand.card_count == 2:
+        evs["DOUBLE_DOWN"] = _double_ev(total, soft, up_value, shoe)
+        evs["SURRENDER"] = -0.5
+        if hand.is_pair:
+            evs["SPLIT"] = _split_ev(hand.cards[0].value, up_value, shoe)
+    return evs
+
+def best_action(hand, up_card, shoe):
+    #returns the action with the highest EV and its EV
+    evs = evaluate_actions(hand, up_card, shoe)
+    action = max(evs, key=evs.get)
+    return action, evs[action]
+
+BasicStrategy = collections.namedtuple("BasicStrategy", "first_two later split")
+
+@functools.lru_cache(maxsize=None)
+def basic_strategy(num_decks=None):
+    #fixed tables from the engine for a full shoe: first_two[soft][total][up value] for two-card hands (all actions
+    #except SPLIT), later[soft][total][up value] for more cards (HIT or STAND), split[pair value][up value]
+    shoe = full_shoe(num_decks)
+    cards = {value: Card('S', rank) for value, rank in zip(range(2, 12), ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'A'))}
+    first_two = [[["STAND"] * 12 for _ in range(22)] for _ in range(2)]
+    later = [[["STAND"] * 12 for _ in range(22)] for _ in range(2)]
+    split = [[False] * 12 for _ in range(12)]
+
+    def representative(total, soft):
+        #two cards with this total, pairs only where no other two cards add up to it (A-A, 2-2, 10-10)
+        if soft:
+            return (cards[11], cards[total - 11] if total > 12 else cards[11])
+        for first in range(2, 11):
+            second = total - first
+            if 2 <= second <= 10 and second != first:
+                return cards[first], cards[second]
+        return cards[total // 2], cards[total // 2]
+
+    for up in range(2, 12):
+        for soft in (0, 1):
+            for total in range(12 if soft else 4, 21):
+                evs = evaluate_actions(HandState(representative(total, soft)), cards[up], shoe)
+                evs.pop("SPLIT", None)
+                first_two[soft][total][up] = max(evs, key=evs.get)
+                later[soft][total][up] = "HIT" if evs["HIT"] > evs["STAND"] else "STAND"
+        for value in range(2, 12):
+            split[value][up] = best_action(HandState((cards[value], cards[value])), cards[up], shoe)[0] == "SPLIT"
+    return BasicStrategy(first_two, later, split)
+
+def basic_strategy_action(hand, up_card):
+    #table lookup for a HandState, used when the recommendation does not arrive in time
+    if hand.total >= 21 or up_card is None:
+        return "STAND"
+    table = basic_strategy()
+    if hand.card_count == 2:
+        if hand.is_pair and table.split[hand.cards[0].value][up_card.value]:
+            return "SPLIT"
+        return table.first_two[int(hand.soft)][hand.total][up_card.value]
+    return table.later[int(hand.soft)][hand.total][up_card.value]
+
+#Shoe tracking and bet sizing
+#Every card we see is removed from a fixed-size count array, the running count uses Hi-Lo.
+#The player edge is estimated from the true count and the bet is a fraction of the Kelly bet.
+TABLE_MIN = 10
+TABLE_MAX = 500
+BET_RETRY = 0.5 #seconds until an automatic seat bets again after the croupier rejected its bet
+MAX_BET_REJECTIONS = 3 #rejected bets in a row after which an automatic seat stops playing
+KELLY_FRACTION = 0.5
+BASE_EDGE = -0.005 #player edge off the top of a fresh shoe
+EDGE_PER_TRUE_COUNT = 0.005
+HAND_VARIANCE = 1.33 #variance of one hand in units of the bet
+HI_LO = (1, 1, 1, 1, 1, 0, 0, 0, -1, -1) #indexed like a shoe composition
+#A reshuffle shows when deal_cards says "reshuffled", when a round starts with no more than CUT_CARD of the shoe left
+#(the croupier reshuffles after the round in which the cut card came out) or at the latest when a value runs out.
+#We only see our own and the dealer's cards, so the shoe left is estimated with CARDS_PER_HAND for every other seat
+#whose turn game_update announced.
+CUT_CARD = 0.25 #share of the shoe behind the cut card
+CARDS_PER_HAND = 2.7 #average cards of a finished hand
+
+class ShoeTracker:
+    def __init__(self, num_decks=None):
+        self.num_decks = num_decks or NUM_DECKS
+        self.reshuffles = 0
+        self.generation = 0 #changes with every reset, cached recommendations of older generations are stale
+        self._round_cards = collections.Counter() #cards of the current round that are already counted
+        self._round_seats = set() #other seats that had a turn in the current round
+        self.reset()
+
+    #fresh shoe, e.g. after the croupier reshuffled
+    def reset(self, num_decks=None):
+        num_decks = num_decks or self.num_decks
+        self.counts = array.array('h', full_shoe(num_decks)) #first, so a deck count that doesn't fit changes nothing
+        self.num_decks = num_decks
+        self.remaining = 52 * num_decks
+        self.unseen = 0.0 #estimated cards of other seats since the reshuffle
+        self.running_count = 0
+        self.generation += 1
+
+    #a round that starts behind the cut card is dealt from a new shoe
+    def start_round(self, reshuffled=False):
+        self._round_cards.clear()
+        self.unseen += len(self._round_seats) * CARDS_PER_HAND
+        self._round_seats.clear()
+        if reshuffled or self.remaining - self.unseen <= CUT_CARD * 52 * self.num_decks:
+            self.reshuffles += 1
+            self.reset()
+
+    def remove(self, card):
+        index = card.value - 2
+        if self.counts[index] == 0: #more cards of this value than the shoe holds: the croupier has reshuffled
+            self.reshuffles += 1
+            self.reset()
+        self.counts[index] -= 1
+        self.remaining -= 1
+        self.running_count += HI_LO[index]
+
+    #counts the cards of the current round that were not counted yet.
+    #cards are all visible cards of a message (our hands and the dealer), a card only counts again if it appears more often.
+    def observe(self, cards):
+        seen = collections.Counter(card for card in cards if card is not None)
+        round_cards = self._round_cards
+        for card, count in seen.items():
+            new = count - round_cards[card]
+            if new > 0:
+                round_cards[card] = count
+                for _ in range(new):
+                    self.remove(card)
+
+    def end_round(self):
+        self._round_cards.clear()
+
+    def other_seat(self, seat_id):
+        self._round_seats.add(seat_id)
+
+    def snapshot(self):
+        return {"num_decks": self.num_decks, "counts": list(self.counts), "remaining": self.remaining,
+                "unseen": self.unseen, "running_count": self.running_count, "reshuffles": self.reshuffles}
+
+    def restore(self, state):
+        self.num_decks = state["num_decks"]
+        self.counts = array.array('h', state["counts"])
+        self.remaining = state["remaining"]
+        self.unseen = state.get("unseen", 0.0) #journals from before the cut card estimate
+        self.running_count = state["running_count"]
+        self.reshuffles = state["reshuffles"]
+        self.generation += 1
+        self._round_cards.clear()
+
+    def composition(self):
+        return tuple(self.counts)
+
+    @property
+    def decks_remaining(self):
+        return max(self.remaining / 52, 0.5)
+
+    @property
+    def true_count(self):
+        return self.running_count / self.decks_remaining
+
+    @property
+    def edge(self):
+        return BASE_EDGE + EDGE_PER_TRUE_COUNT * self.true_count
+
+#fractional Kelly bet within the table limits, never more than the capital
+def kelly_bet(capital, edge):
+    if capital <= 0:
+        return 0
+    bet = capital * KELLY_FRACTION * edge / HAND_VARIANCE if edge > 0 else 0
+    return int(min(max(bet, TABLE_MIN), TABLE_MAX, capital))
+
+
+#Wire format
+#JSON is the default. If binary is enabled (--binary), requests to the croupier/counter advertise "wire_formats" and every
+#peer that answers with a binary datagram (or advertises "bin1" itself) gets binary datagrams from then on.
+#Binary datagram: magic, version, flags, type code, u16 bitmask of the present payload fields, then the fields in schema order.
+#Flag bit 0 means that a u32 sequence number (reliable delivery) follows the header, bit 1 that the two u32 of the epoch
+#follow after it.
+BINARY_WIRE = False
+WIRE_FORMATS = ["bin1", "json"]
+WIRE_MAGIC = 0xB7
+WIRE_VERSION = 1
+CARD_HIDDEN_CODE = 0xFE
+CARD_NONE_CODE = 0xFF
+
+peer_wire_formats = {} #(ip, port) -> "bin1" for peers that speak the binary format
+
+_HEADER = struct.Struct("!BBBBH")
+_U8 = struct.Struct("!B")
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+FLAG_SEQ = 0x01
+FLAG_EPOCH = 0x02
+_F64 = struct.Struct("!d")
+
+#message type -> (type code, payload fields in order with their kind)
+_BINARY_SCHEMAS = {
+    "bet": (1, (("player_id", "id"), ("player_nickname", "str"), ("amount", "amount"), ("player_listen_addr", "addr"))),
+    "deal_cards": (2, (("player_id", "id"), ("player_hand", "cards"), ("dealer_up_card", "card"), ("bet_amount", "amount"))),
+    "game_update": (3, (("player_id", "id"), ("all_player_hands", "hands"), ("dealer_hand", "cards"), ("current_player_turn_id", "id"),
+                        ("current_player_turn_nickname", "str"), ("current_hand_index", "u8"))),
+    "player_action": (4, (("player_id", "id"), ("action", "str"))),
+    "recommendation_request": (5, (("player_id", "id"), ("player_hand", "cards"), ("dealer_up_card", "card"), ("player_listen_addr", "addr"),
+                                   ("request_id", "u32"))),
+    "action_recommendation": (6, (("player_id", "id"), ("recommended_action", "str"), ("expected_value", "float"), ("request_id", "u32"))),
+    "game_result": (7, (("player_id", "id"), ("result", "str"), ("payout", "amount"), ("player_hand", "cards"), ("dealer_hand", "cards"))),
+    "round_ended": (8, (("player_id", "id"),)),
+    "statistics_request": (9, (("requester_id", "id"), ("requester_listen_addr", "addr"))),
+    "reject_bet": (10, (("player_id", "id"), ("reason", "str"))),
+    "ack": (11, (("seq", "u32"),)),
+}
+_BINARY_TYPES_BY_CODE = {code: (msg_type, fields) for msg_type, (code, fields) in _BINARY_SCHEMAS.items()}
+_BINARY_FIELD_NAMES = {msg_type: frozenset(key for key, _ in fields) for msg_type, (_, fields) in _BINARY_SCHEMAS.items()}
+
+def _put_id(out, value):
+    player_uuid = uuid.UUID(value)
+    if str(player_uuid) != value:
+        raise ValueError("id is not a canonical UUID")
+    out += player_uuid.bytes
+
+def _put_card(out, value):
+    if value == "HIDDEN":
+        out.append(CARD_HIDDEN_CODE)
+    elif value is None:
+        out.append(CARD_NONE_CODE)
+    else:
+        out.append(_CARDS_BY_STR[value].code)
+
+def _put_cards(out, value):
+    out += _U8.pack(len(value))
+    for card in value:
+        _put_card(out, card)
+
+def _put_hands(out, value):
+    out += _U8.pack(len(value))
+    for cards in value:
+        _put_cards(out, cards)
+
+def _put_str(out, value):
+    data = value.encode("utf-8")
+    out += _U8.pack(len(data))
+    out += data
+
+def _put_amount(out, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError("amount must be a number")
+    out += _F64.pack(value)
+
+def _put_float(out, value):
+    out += _F64.pack(value)
+
+def _put_addr(out, value):
+    ip, port = value
+    _put_str(out, ip)
+    out += _U16.pack(port)
+
+def _put_u8(out, value):
+    out += _U8.pack(value)
+
+def _put_u32(out, value):
+    out += _U32.pack(value)
+
+def _get_id(data, offset):
+    return str(uuid.UUID(bytes=bytes(data[offset:offset + 16]))), offset + 16
+
+def _get_card(data, offset):
+    code = data[offset]
+    if code == CARD_HIDDEN_CODE:
+        return "HIDDEN", offset + 1
+    if code == CARD_NONE_CODE:
+        return None, offset + 1
+    return CARDS_BY_CODE[code].to_json(), offset + 1
+
+def _get_cards(data, offset):
+    count = data[offset]
+    offset += 1
+    cards = []
+    for _ in range(count):
+        card, offset = _get_card(data, offset)
+        cards.append(card)
+    return cards, offset
+
+def _get_hands(data, offset):
+    count = data[offset]
+    offset += 1
+    hands = []
+    for _ in range(count):
+        cards, offset = _get_cards(data, offset)
+        hands.append(cards)
+    return hands, offset
+
+def _get_str(data, offset):
+    length = data[offset]
+    end = offset + 1 + length
+    if end > len(data):
+        raise ValueError("string exceeds datagram")
+    return str(data[offset + 1:end], "utf-8"), end
+
+def _get_amount(data, offset):
+    value = _F64.unpack_from(data, offset)[0]
+    return (int(value) if value.is_integer() else value), offset + 8
+
+def _get_float(data, offset):
+    return _F64.unpack_from(data, offset)[0], offset + 8
+
+def _get_addr(data, offset):
+    ip, offset = _get_str(data, offset)
+    return [ip, _U16.unpack_from(data, offset)[0]], offset + 2
+
+def _get_u8(data, offset):
+    return data[offset], offset + 1
+
+def _get_u32(data, offset):
+    return _U32.unpack_from(data, offset)[0], offset + 4
+
+_FIELD_ENCODERS = {"id": _put_id, "card": _put_card, "cards": _put_cards, "hands": _put_hands, "str": _put_str,
+                   "amount": _put_amount, "float": _put_float, "addr": _put_addr, "u8": _put_u8, "u32": _put_u32}
+_FIELD_DECODERS = {"id": _get_id, "card": _get_card, "cards": _get_cards, "hands": _get_hands, "str": _get_str,
+                   "amount": _get_amount, "float": _get_float, "addr": _get_addr, "u8": _get_u8, "u32": _get_u32}
+
+#returns the binary datagram, or None if the message can't be represented exactly (then JSON is used)
+def encode_binary(message_dict):
+    msg_type = message_dict.get("type")
+    schema = _BINARY_SCHEMAS.get(msg_type)
+    payload = message_dict.get("payload", {})
+    if schema is None or not isinstance(payload, dict) or not _BINARY_FIELD_NAMES[msg_type].issuperset(payload):
+        return None
+    if not {"type", "payload", "seq", "epoch"}.issuperset(message_dict):
+        return None
+    code, fields = schema
+    seq = message_dict.get("seq")
+    epoch = message_dict.get("epoch")
 
+    out = bytearray(_HEADER.size)
+    mask = 0
+    try:
+        if seq is not None:
+            _put_u32(out, seq)
+        if epoch is not None:
+            if len(epoch) != 2:
+                return None
+            _put_u32(out, epoch[0])
+            _put_u32(out, epoch[1])
+        for bit, (key, kind) in enumerate(fields):
+            if key in payload:
+                mask |= 1 << bit
+                _FIELD_ENCODERS[kind](out, payload[key])
+    except (ValueError, TypeError, KeyError, AttributeError, struct.error):
+        return None
+    flags = (FLAG_SEQ if seq is not None else 0) | (FLAG_EPOCH if epoch is not None else 0)
+    _HEADER.pack_into(out, 0, WIRE_MAGIC, WIRE_VERSION, flags, code, mask)
+    return bytes(out)
+
+def decode_binary(data):
+    magic, version, flags, code, mask = _HEADER.unpack_from(data, 0)
+    if magic != WIRE_MAGIC or version != WIRE_VERSION or code not in _BINARY_TYPES_BY_CODE:
+        raise ValueError(f"Unbekanntes Binärformat (Version {version}, Typ {code})")
+    msg_type, fields = _BINARY_TYPES_BY_CODE[code]
+    message = {"type": msg_type}
+    offset = _HEADER.size
+    if flags & FLAG_SEQ:
+        message["seq"], offset = _get_u32(data, offset)
+    if flags & FLAG_EPOCH:
+        sender_epoch, offset = _get_u32(data, offset)
+        receiver_epoch, offset = _get_u32(data, offset)
+        message["epoch"] = [sender_epoch, receiver_epoch]
+    payload = {}
+    for bit, (key, kind) in enumerate(fields):
+        if mask & (1 << bit):
+            payload[key], offset = _FIELD_DECODERS[kind](data, offset)
+    message["payload"] = payload
+    return message
+
+#encodes a message for a peer: binary if the peer negotiated it, otherwise JSON (advertising binary if enabled)
+def encode_message(message_dict, peer):
+    if BINARY_WIRE:
+        if peer_wire_formats.get(peer) == "bin1":
+            data = encode_binary(message_dict)
+            if data is not None:
+                return data
+        elif "player_listen_addr" in message_dict.get("payload", {}) or "requester_listen_addr" in message_dict.get("payload", {}):
+            message_dict = {**message_dict, "payload": {**message_dict["payload"], "wire_formats": WIRE_FORMATS}}
+    return json.dumps(message_dict).encode('utf-8')
+
+#decodes a JSON or binary datagram and remembers the peer's wire format
+def decode_datagram(data, peer):
+    if data[:1] == b"{":
+        message = json.loads(str(data, 'utf-8'))
+        payload = message.get("payload") if isinstance(message, dict) else None
+        if isinstance(payload, dict) and "bin1" in (payload.get("wire_formats") or ()):
+            peer_wire_formats[peer] = "bin1"
+        return message
+    message = decode_binary(data)
+    peer_wire_formats[peer] = "bin1"
+    return message
+
+
+#Reliable delivery
+#Opt-in with --reliable, the croupier and counter must acknowledge every message that carries a "seq" with
+#{"type": "ack", "payload": {"seq": n}}. Sequence numbers are per peer, unacknowledged messages are retransmitted
+#with an RTT-based timeout (exponential backoff). Received messages are handled in sequence order: a message that
+#overtakes a lost one is held back until the retransmission arrives (or the gap is older than REORDER_TIMEOUT, when
+#the sender has run out of retries), duplicates (e.g. a retransmitted game_result) are acknowledged again but not
+#handled twice. A skipped message that still arrives is handled late instead of being taken for a duplicate. Both
+#sides number from 0, so a lost first message is waited for like any other gap.
+#Messages and acks also carry "epoch": [sender's epoch, receiver's epoch as the sender knows it (0 = unknown)], a
+#random number per ReliableDelivery. When a peer shows up with a new epoch it was restarted: both directions of the
+#channel start again at 0 and the unacknowledged messages are renumbered. A message numbered for an earlier epoch of
+#the receiver is not handled, its ack carries the new epoch so the sender renumbers it. Peers that send no epoch are
+#handled as before.
+RELIABLE = False
+RTO_INITIAL = 0.2 #seconds, until the first RTT sample
+RTO_MIN = 0.02
+RTO_MAX = 2.0
+MAX_RETRIES = 8
+SEND_WINDOW = 64 #unacknowledged messages per peer, more are queued
+RECEIVE_BUFFER_SIZE = 1024 #held back messages per peer, more skip the gap
+REORDER_TIMEOUT = (MAX_RETRIES + 1) * RTO_MAX #seconds until a gap is skipped, longer than the sender retries
+
+class _PeerChannel:
+    __slots__ = ('next_seq', 'pending', 'backlog', 'srtt', 'rttvar', 'rto', 'expected', 'held', 'skipped', 'gap_timer',
+                 'deliver', 'peer_epoch')
+
+    def __init__(self):
+        self.next_seq = 0
+        self.pending = {} #seq -> [data, via, sent_at, retries, timer, message without seq], in sequence order
+        self.backlog = collections.deque()
+        self.srtt = None
+        self.rttvar = 0.0
+        self.rto = RTO_INITIAL
+        self.expected = 0 #next sequence number to handle
+        self.held = {} #seq -> message that arrived before expected
+        self.skipped = {} #seq -> None, the last RECEIVE_BUFFER_SIZE skipped sequence numbers in skip order
+        self.gap_timer = None
+        self.deliver = None
+        self.peer_epoch = None #epoch of the peer, None until it sent one
+
+class ReliableDelivery:
+    record_metrics = True
+
+    def __init__(self):
+        self.epoch = random.getrandbits(32) or 1 #0 means unknown
+        self.peers = {}
+        self.retransmissions = 0
+        self.duplicates = 0
+        self.failures = 0
+        self.skipped_gaps = 0
+        self.late = 0
+        self.invalid = 0
+        self.stale = 0
+        self.peer_restarts = 0
+
+    #the player's datagrams go through the local impairment, the stand-ins in Testumgebung.py send directly
+    def _send_datagram(self, via, data, peer):
+        _send_datagram(via, data, peer)
+
+    def _channel(self, peer):
+        channel = self.peers.get(peer)
+        if channel is None:
+            channel = self.peers[peer] = _PeerChannel()
+        return channel
+
+    def send(self, message_dict, peer, via):
+        channel = self._channel(peer)
+        seq = channel.next_seq
+        channel.next_seq = (seq + 1) & 0xFFFFFFFF
+        data = encode_message({**message_dict, "seq": seq, "epoch": [self.epoch, channel.peer_epoch or 0]}, peer)
+        if len(channel.pending) >= SEND_WINDOW:
+            channel.backlog.append((seq, data, via, message_dict))
+        else:
+            self._transmit(channel, peer, seq, data, via, message_dict)
+
+    def _transmit(self, channel, peer, seq, data, via, message_dict):
+        loop = asyncio.get_running_loop()
+        self._send_datagram(via, data, peer)
+        timer = loop.call_later(channel.rto, self._retransmit, peer, seq)
+        channel.pending[seq] = [data, via, loop.time(), 0, timer, message_dict]
+
+    def _retransmit(self, peer, seq):
+        channel = self.peers[peer]
+        entry = channel.pending.get(seq)
+        if entry is None:
+            return
+        if entry[3] >= MAX_RETRIES:
+            del channel.pending[seq]
+            self.failures += 1
+            log.warning("delivery_failed", ip=peer[0], port=peer[1], seq=seq, retries=MAX_RETRIES)
+            self._fill_window(channel, peer)
+            return
+        entry[3] += 1
+        self.retransmissions += 1
+        self._send_datagram(entry[1], entry[0], peer)
+        backoff = min(channel.rto * (2 ** entry[3]), RTO_MAX) #exponential backoff per message
+        entry[4] = asyncio.get_running_loop().call_later(backoff, self._retransmit, peer, seq)
+
+    def _fill_window(self, channel, peer):
+        while channel.backlog and len(channel.pending) < SEND_WINDOW:
+            self._transmit(channel, peer, *channel.backlog.popleft())
+
+    def _on_ack(self, peer, seq):
+        channel = self.peers.get(peer)
+        entry = channel.pending.pop(seq, None) if channel else None
+        if entry is None:
+            return
+        entry[4].cancel()
+        if entry[3] == 0: #Karn: only messages that were sent once give a valid RTT sample
+            sample = asyncio.get_running_loop().time() - entry[2]
+            if channel.srtt is None:
+                channel.srtt = sample
+                channel.rttvar = sample / 2
+            else:
+                channel.rttvar = 0.75 * channel.rttvar + 0.25 * abs(channel.srtt - sample)
+                channel.srtt = 0.875 * channel.srtt + 0.125 * sample
+            channel.rto = min(max(channel.srtt + 4 * channel.rttvar, RTO_MIN), RTO_MAX)
+            if self.record_metrics:
+                metrics.record(f"ack_rtt:{peer[0]}:{peer[1]}", sample)
+        self._fill_window(channel, peer)
+
+    #calls deliver(message, peer) for every message in sequence order, acks and duplicates are not delivered
+    def on_receive(self, message, peer, via, deliver):
+        if not isinstance(message, dict):
+            deliver(message, peer)
+            return
+        epoch = message.get("epoch")
+        if epoch is not None and not (isinstance(epoch, list) and len(epoch) == 2 and all(map(_valid_seq, epoch))):
+            self._reject_seq(peer, epoch)
+            return
+        if message.get("type") == "ack":
+            payload = message.get("payload")
+            seq = payload.get("seq") if isinstance(payload, dict) else None
+            if not _valid_seq(seq):
+                self._reject_seq(peer, seq)
+            elif epoch is None:
+                self._on_ack(peer, seq)
+            elif not self._peer_restarted(peer, epoch[0]) and epoch[1] == self.epoch:
+                self._on_ack(peer, seq) #acks of a restarted peer or for our earlier epoch refer to other numbers
+            return
+        seq = message.get("seq")
+        if seq is None:
+            deliver(message, peer)
+            return
+        if not _valid_seq(seq):
+            self._reject_seq(peer, seq)
+            return
+        ack = {"type": "ack", "payload": {"seq": seq}}
+        if epoch is not None:
+            self._peer_restarted(peer, epoch[0])
+            ack["epoch"] = [self.epoch, epoch[0]]
+        self._send_datagram(via, encode_message(ack, peer), peer)
+        if epoch is not None and epoch[1] not in (0, self.epoch):
+            self.stale += 1 #numbered for our previous epoch, the ack tells the sender to renumber it
+            return
+        channel = self._channel(peer)
+        channel.deliver = deliver
+        if (seq - channel.expected) & 0xFFFFFFFF >= 0x80000000: #before expected: handled or skipped
+            if seq in channel.skipped:
+                del channel.skipped[seq]
+                self.late += 1
+                deliver(message, peer)
+            else:
+                self.duplicates += 1
+            return
+        if seq in channel.held:
+            self.duplicates += 1
+            return
+        channel.held[seq] = message
+        self._release(channel, peer)
+
+    #notes the peer's epoch, returns True if it changed: then both directions start again at 0
+    def _peer_restarted(self, peer, epoch):
+        channel = self._channel(peer)
+        previous, channel.peer_epoch = channel.peer_epoch, epoch
+        if previous is None or previous == epoch:
+            return False
+        self.peer_restarts += 1
+        log.info("peer_restarted", ip=peer[0], port=peer[1])
+        if channel.gap_timer is not None:
+            channel.gap_timer.cancel()
+            channel.gap_timer = None
+        channel.expected = 0
+        channel.held.clear()
+        channel.skipped.clear()
+        unacknowledged = [(entry[5], entry[1]) for entry in channel.pending.values()]
+        unacknowledged += [(message_dict, via) for _, _, via, message_dict in channel.backlog]
+        for entry in channel.pending.values():
+            entry[4].cancel()
+        channel.pending.clear()
+        channel.backlog.clear()
+        channel.next_seq = 0
+        for message_dict, message_via in unacknowledged:
+            self.send(message_dict, peer, message_via)
+        return True
+
+    def _reject_seq(self, peer, seq):
+        self.invalid += 1
+        log.warning("invalid_seq", ip=peer[0], port=peer[1], seq=repr(seq))
+
+    def _release(self, channel, peer):
+        expected = channel.expected
+        while channel.expected in channel.held:
+            message = channel.held.pop(channel.expected)
+            channel.expected = (channel.expected + 1) & 0xFFFFFFFF
+            channel.deliver(message, peer)
+        if not channel.held:
+            if channel.gap_timer is not None:
+                channel.gap_timer.cancel()
+                channel.gap_timer = None
+        elif len(channel.held) > RECEIVE_BUFFER_SIZE:
+            self._skip_gap(peer)
+        elif channel.gap_timer is None or channel.expected != expected: #a new gap gets the full timeout
+            if channel.gap_timer is not None:
+                channel.gap_timer.cancel()
+            channel.gap_timer = asyncio.get_running_loop().call_later(REORDER_TIMEOUT, self._skip_gap, peer)
+
+    def _skip_gap(self, peer):
+        channel = self.peers[peer]
+        if channel.gap_timer is not None:
+            channel.gap_timer.cancel()
+            channel.gap_timer = None
+        if channel.held:
+            self.skipped_gaps += 1
+            first = min(channel.held, key=lambda seq: (seq - channel.expected) & 0xFFFFFFFF)
+            gap = min((first - channel.expected) & 0xFFFFFFFF, RECEIVE_BUFFER_SIZE)
+            for offset in range(gap, 0, -1):
+                channel.skipped[(first - offset) & 0xFFFFFFFF] = None
+            while len(channel.skipped) > RECEIVE_BUFFER_SIZE:
+                del channel.skipped[next(iter(channel.skipped))]
+            channel.expected = first
+            self._release(channel, peer)
+
+def _valid_seq(seq):
+    return type(seq) is int and 0 <= seq <= 0xFFFFFFFF
+
+reliable_delivery = ReliableDelivery()
+
+
+#Local loss/reorder injection to test the player and the reliability layer (--loss, --duplicate, --reorder)
+class NetworkImpairment:
+    def __init__(self, loss=0.0, duplicate=0.0, reorder=0.0, seed=None):
+        self.loss = loss
+        self.duplicate = duplicate
+        self.reorder = reorder #maximum extra delay in seconds, datagrams overtake each other
+        self.random = random.Random(seed)
+        self.dropped = 0
+        self.duplicated = 0
+
+    def deliver(self, callback, *args):
+        if self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        copies = 1
+        if self.random.random() < self.duplicate:
+            copies = 2
+            self.duplicated += 1
+        for _ in range(copies):
+            if self.reorder:
+                asyncio.get_running_loop().call_later(self.random.uniform(0, self.reorder), callback, *args)
+            else:
+                callback(*args)
 
-#Functions handling incoming messages and game flow
-def _handle_message(message, sender_addr):
-    global player_hand, player_capital, current_bet, game_in_progress, dealer_up_card, recommended_action, player_turn_active, is_betting_phase, nickname
+impairment = None #NetworkImpairment applied to every sent and received datagram
 
-    msg_type = message.get("type")
-    payload = message.get("payload", {})
+def _send_datagram(via, data, peer):
+    if impairment is not None:
+        impairment.deliver(via.sendto, data, peer)
+    else:
+        via.sendto(data, peer)
 
-    print(f"<- Received from {sender_addr[0]}:{sender_addr[1]}: {msg_type} {payload}")
-
-    if msg_type == "deal_cards":
-        #This is the start of a new round, Ensure it's for this player
-        if payload.get("player_id") == player_id:
-            #Convert received card strings to Card objects
-            player_hand = [_card_from_str(s) for s in payload.get("player_hand", [])]
-            dealer_up_card = _card_from_str(payload.get("dealer_up_card"))
-            current_bet = payload.get("bet_amount", current_bet) #Croupier might confirm/adjust bet
-            game_in_progress = True
-            is_betting_phase = False #No longer in betting phase
-            player_turn_active = False #Will be set by game_update
-
-            print(f"\n--- Neues Spiel gestartet ---")
-            print(f"Deine Hand: {[str(c) for c in player_hand]} (Wert: {calculate_hand_value(player_hand)})")
-            print(f"Croupier's sichtbare Karte: {dealer_up_card}")
-            print(f"Dein Einsatz: {current_bet}")
-            print(f"Dein Kapital: {player_capital}")
-            
-            #If no blackjack right at the beginning, wait for YOUR_TURN (via game_update)
-            if calculate_hand_value(player_hand) == 21 and len(player_hand) == 2:
-                print("BLACKJACK! Warte auf Rundenergebnis.")
-            elif calculate_hand_value(player_hand) > 21:
-                print("Busted at start! Warte auf Rundenergebnis.")
 
+#General function to send UDP messages
+def _send_udp_message(target_ip, target_port, message_dict, via=None):
+    try:
+        peer = (target_ip, target_port)
+        if RELIABLE:
+            reliable_delivery.send(message_dict, peer, via or transport)
+        else:
+            _send_datagram(via or transport, encode_message(message_dict, peer), peer)
+        metrics.counters["datagrams_sent"] += 1
+        if journal is not None:
+            journal.record_message(JOURNAL_OUT, message_dict, peer)
+        if log.debug_on:
+            log.debug("sent", ip=target_ip, port=target_port, type=message_dict.get('type'), payload=message_dict.get('payload', ''))
+    except Exception as e:
+        log.error("send_failed", ip=target_ip, port=target_port, error=str(e))
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+#Message dispatch
+#Every message type has a handler (a PlayerSession method), a payload schema that is compiled into a validator once,
+#and a route: "player" (the session named by player_id), "broadcast" (all sessions) or "recommendation".
+#Invalid payloads are rejected before any session state is touched.
+_MISSING = object()
+_VALID_ACTIONS = frozenset(("HIT", "STAND", "DOUBLE_DOWN", "SPLIT", "SURRENDER"))
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_card(value):
+    return value is None or value == "HIDDEN" or value in _CARDS_BY_STR
+
+def _is_cards(value):
+    return isinstance(value, list) and all(isinstance(c, str) and (c == "HIDDEN" or c in _CARDS_BY_STR) for c in value)
+
+_FIELD_CHECKS = {
+    "id": lambda value: isinstance(value, str),
+    "str": lambda value: isinstance(value, str),
+    "str?": lambda value: value is None or isinstance(value, str),
+    "number": _is_number,
+    "number?": lambda value: value is None or _is_number(value),
+    "int": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "decks": lambda value: isinstance(value, int) and not isinstance(value, bool) and 1 <= value <= MAX_DECKS,
+    "action": lambda value: isinstance(value, str) and value in _VALID_ACTIONS,
+    "card": lambda value: isinstance(value, (str, type(None))) and _is_card(value),
+    "cards": _is_cards,
+    "hands": lambda value: isinstance(value, list) and all(_is_cards(hand) for hand in value),
+}
+
+def _compile_validator(schema):
+    #schema: field -> (kind, required), returns a function payload -> error text or None
+    checks = tuple((key, required, _FIELD_CHECKS[kind]) for key, (kind, required) in schema.items())
+
+    def validate(payload):
+        if not isinstance(payload, dict):
+            return "payload ist kein Objekt"
+        for key, required, check in checks:
+            value = payload.get(key, _MISSING)
+            if value is _MISSING:
+                if required:
+                    return f"'{key}' fehlt"
+            elif not check(value):
+                return f"'{key}' ist ungültig: {value!r}"
+        return None
+    return validate
+
+MessageRoute = collections.namedtuple("MessageRoute", "handler validate route")
+MESSAGE_HANDLERS = {} #message type -> MessageRoute
+message_counters = collections.defaultdict(lambda: [0, 0]) #message type -> [handled, rejected]
+_subscribers = collections.defaultdict(list) #message type (None for all) -> callbacks
+
+def register_message(msg_type, schema, route="player"):
+    def decorator(handler):
+        MESSAGE_HANDLERS[msg_type] = MessageRoute(handler, _compile_validator(schema), route)
+        return handler
+    return decorator
+
+#callback(msg_type, payload, sender_addr) is called after a message of that type (None: every type) was handled
+def subscribe(msg_type, callback):
+    _subscribers[msg_type].append(callback)
+
+def unsubscribe(msg_type, callback):
+    _subscribers[msg_type].remove(callback)
+
+
+#Recommendation cache
+#With the counter as source, the dealt hand is asked for as soon as deal_cards arrives, and after a HIT answer every hand
+#that is one card further, so the answer is usually there when game_update says it is our turn. Requests carry a
+#request_id, but only a counter that echoes it can be asked ahead: until a seat has seen an answer with its request_id
+#it asks once per turn, takes an answer without request_id for its only open request, doesn't cache it and drops
+#answers it can't match.
+PREFETCH = True #--no-prefetch only asks the counter on our turn
+RECOMMENDATION_CACHE_SIZE = 512 #answers per seat
+_recommendation_ids = itertools.count(1)
+_CARDS_BY_VALUE = tuple(Card('S', rank) for rank in ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'A')) #one card per value
+
+#In automatic play (bots, 'autoplay on') a turn waits at most DECISION_DEADLINE seconds for the counter, then the
+#basic strategy table decides (--deadline, 0 waits for the counter).
+DECISION_DEADLINE = 0.0
+
+class RecommendationCache:
+    #LRU of (hand values, up card value, true count) -> (action, expected value) for one shoe generation
+    def __init__(self, size=None):
+        self.size = size or RECOMMENDATION_CACHE_SIZE
+        self.entries = collections.OrderedDict()
+        self.generation = None
+
+    def _check_generation(self, generation):
+        if generation != self.generation: #the shoe was reset, every answer is stale
+            self.entries.clear()
+            self.generation = generation
+
+    def get(self, key, generation):
+        self._check_generation(generation)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, generation, value):
+        self._check_generation(generation)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+#One seat at the table. The interactive player is a single session, the bot mode runs many of them in one process.
+class PlayerSession:
+    def __init__(self, player_id, nickname, capital, via=None, listen_addr=None, auto=False, max_rounds=0,
+                 croupier_addr=None, counter_addr=None):
+        self.player_id = player_id
+        self.nickname = nickname
+        self.via = via #transport the session sends on, None means the global transport
+        self.listen_addr = listen_addr or [PLAYER_IP, PLAYER_PORT]
+        self.croupier_addr = croupier_addr or (CROUPIER_IP, CROUPIER_PORT) #the table this seat plays at
+        self.counter_addr = counter_addr or (COUNTER_IP, COUNTER_PORT)
+        allowed_peers.update((tuple(self.croupier_addr), tuple(self.counter_addr)))
+        self.auto = auto #act on every recommendation and bet automatically (no input)
+        self.max_rounds = max_rounds #0 means unlimited
+
+        self.player_hands = [HandState()] #One HandState per hand, more than one after a split
+        self.player_hand = self.player_hands[0] #The HandState that is currently played
+        self.player_capital = capital
+        self.current_bet = 0
+        self.reserved = 0 #stake reserved in the shared bankroll for the current round
+        self.seated = False #joined the shared bankroll
+        self.game_in_progress = False
+        self.dealer_up_card = None #Stores the dealer's visible card
+        self.recommended_action = None
+        self.recommendation_source = "counter" #"counter" asks the Kartenzähler, "local" uses the strategy engine
+        self.player_turn_active = False
+        self.is_betting_phase = True
+        self.shoe = ShoeTracker()
+
+        #throughput and latency of the rounds (bet sent -> game_result)
+        self.started_at = time.perf_counter()
+        self.rounds = 0
+        self.round_latencies = []
+        self.bet_sent_at = None
+        self.finished = False
+
+        #recommendations from the counter: open requests, answers cached per hand, up card and count
+        self.pending_recommendations = collections.OrderedDict() #request_id -> (cache key, sent at)
+        self.counter_echoes_request_id = False #set by the first answer that carries one of our request_ids
+        self.recommendations = RecommendationCache()
+        self.awaiting_key = None #cache key of the hand whose recommendation we wait for on our turn
+        self.decision_timer = None #asyncio.TimerHandle of the DECISION_DEADLINE of the current turn
+        self.fallbacks = 0 #turns decided by the basic strategy table because the deadline passed
+        self.rejected_bets = 0 #bets the croupier rejected in a row
+
+        #request -> response times for the metrics
+        self.croupier_request = None #(message type, sent at) of the last bet/player_action
+
+    def _send(self, target_ip, target_port, message_dict):
+        _send_udp_message(target_ip, target_port, message_dict, self.via)
+
+    #cache key of a hand: the counter's answer depends on the cards, the up card and the count
+    def recommendation_key(self, cards):
+        up_value = self.dealer_up_card.value if self.dealer_up_card else None
+        return tuple(sorted(card.value for card in cards)), up_value, round(self.shoe.true_count)
+
+    #sends a recommendation_request for cards unless the same hand is already asked for
+    def _send_recommendation_request(self, cards, key):
+        if any(pending_key == key for pending_key, _ in self.pending_recommendations.values()):
+            return
+        if not self.counter_echoes_request_id:
+            self._cancel_recommendation_requests() #one request at a time, an older one of this round is superseded
+        request_id = next(_recommendation_ids)
+        recommendation_request_message = {
+            "type": "recommendation_request",
+            "payload": {
+                "player_id": self.player_id,
+                "player_hand": [c.to_json() for c in cards],
+                "dealer_up_card": self.dealer_up_card.to_json() if self.dealer_up_card else None,
+                "player_listen_addr": self.listen_addr,
+                "request_id": request_id
+            }
+        }
+        self.pending_recommendations[request_id] = (key, time.perf_counter())
+        _recommendation_requests[request_id] = self
+        self._send(*self.counter_addr, recommendation_request_message)
+
+    #asks the counter ahead of our turn, for the dealt hand and (after a HIT answer) every hand one card further
+    def prefetch_recommendations(self, cards):
+        if (not PREFETCH or not self.counter_echoes_request_id or self.recommendation_source != "counter"
+                or self.dealer_up_card is None):
+            return
+        key = self.recommendation_key(cards)
+        if HandState(cards).total < 21 and self.recommendations.get(key, self.shoe.generation) is None:
+            metrics.counters["recommendation_prefetched"] += 1
+            self._send_recommendation_request(cards, key)
+
+    #requests a recommendation from counter, answered from the cache if the hand was prefetched
+    def request_recommendation_from_counter(self):
+        key = self.recommendation_key(self.player_hand.cards)
+        cached = self.recommendations.get(key, self.shoe.generation)
+        if cached is not None:
+            metrics.counters["recommendation_cache_hit"] += 1
+            self._handle_recommendation(cached[0], cached[1], "Kartenzähler (Cache)")
+            return
+        metrics.counters["recommendation_cache_miss"] += 1
+        self.awaiting_key = key
+        self._send_recommendation_request(self.player_hand.cards, key)
+        if self.auto and DECISION_DEADLINE > 0:
+            self._cancel_decision_deadline()
+            self.decision_timer = asyncio.get_running_loop().call_later(DECISION_DEADLINE, self._decision_deadline_passed)
+
+    def _decision_deadline_passed(self):
+        self.decision_timer = None
+        if not self.player_turn_active:
+            return
+        action = basic_strategy_action(self.player_hand, self.dealer_up_card)
+        self.fallbacks += 1
+        metrics.counters["deadline_fallback"] += 1
+        log.info("deadline_fallback", player=self.nickname, deadline=DECISION_DEADLINE, action=action)
+        self.awaiting_key = None #a late answer only goes into the cache
+        self._handle_recommendation(action, None, "Basisstrategie")
+
+    def _cancel_decision_deadline(self):
+        if self.decision_timer is not None:
+            self.decision_timer.cancel()
+            self.decision_timer = None
+
+    def _cancel_recommendation_requests(self):
+        for request_id in self.pending_recommendations:
+            _recommendation_requests.pop(request_id, None)
+        self.pending_recommendations.clear()
+
+    #computes the recommendation with the local strategy engine instead of waiting for the counter
+    def compute_local_recommendation(self):
+        return best_action(self.player_hand, self.dealer_up_card, self.shoe.composition())
+
+    #gets a recommendation from the configured source
+    def request_recommendation(self):
+        if self.recommendation_source == "local" and self.dealer_up_card is not None:
+            started = time.perf_counter()
+            action, expected_value = self.compute_local_recommendation()
+            metrics.record("local_recommendation", time.perf_counter() - started)
+            self._handle_recommendation(action, expected_value, "Strategie-Engine")
+        else:
+            self.request_recommendation_from_counter()
+
+    #capital the next stake can come from: the seat's own or what is left of the shared bankroll
+    @property
+    def available_capital(self):
+        return self.player_capital if bankroll is None else bankroll.available
+
+    #capital the bets are sized against: the seat's own or its share of the shared bankroll (including running stakes)
+    @property
+    def betting_capital(self):
+        if bankroll is None:
+            return self.player_capital
+        return min((bankroll.available + bankroll.reserved) / max(bankroll.seats, 1), bankroll.available)
+
+    def join_bankroll(self):
+        if bankroll is not None and not self.seated:
+            bankroll.join()
+            self.seated = True
+
+    def leave_bankroll(self):
+        if self.seated:
+            bankroll.leave()
+            self.seated = False
+
+    def _finish(self):
+        self.finished = True
+        self.leave_bankroll()
+        _on_session_finished()
+
+    #True if the seat may stake amount more, bringing its stake in this round to total. With a shared bankroll the amount
+    #is reserved right away and stays reserved until the round is settled.
+    def _can_stake(self, amount, total):
+        if bankroll is None:
+            return self.player_capital >= total
+        if not bankroll.reserve(amount):
+            return False
+        self.reserved += amount
+        return True
+
+    def _settle_stake(self, payout):
+        if bankroll is not None and (self.reserved or payout):
+            bankroll.settle(self.reserved, payout)
+        self.reserved = 0
+
+    #calculates the optimal bet amount
+    def determine_optimal_bet(self):
+        capital = self.betting_capital
+        if capital <= 0:
+            log.info("no_capital", player=self.nickname)
+            return 0
+
+        bet_amount = kelly_bet(capital, self.shoe.edge)
+        if log.info_on:
+            log.info("bet_calculated", player=self.nickname, amount=bet_amount, true_count=self.shoe.true_count, edge=self.shoe.edge)
+        return bet_amount
+
+    #Functions handling incoming messages and game flow, registered in MESSAGE_HANDLERS
+    @register_message("deal_cards", {"player_id": ("id", True), "player_hand": ("cards", True),
+                                     "dealer_up_card": ("card", False), "bet_amount": ("number", False)})
+    def _on_deal_cards(self, payload, sender_addr):
+        self._croupier_replied(sender_addr)
+        #This is the start of a new round
+        #Convert received card strings to Card objects
+        self.player_hands = [HandState(_card_from_str(s) for s in payload["player_hand"])]
+        self.player_hand = self.player_hands[0]
+        self.dealer_up_card = _card_from_str(payload.get("dealer_up_card"))
+        self.current_bet = payload.get("bet_amount", self.current_bet) #Croupier might confirm/adjust bet
+        self.game_in_progress = True
+        self.is_betting_phase = False #No longer in betting phase
+        self.player_turn_active = False #Will be set by game_update
+        self.rejected_bets = 0
+
+        self.shoe.start_round(payload.get("reshuffled") is True)
+        self._observe_cards(self.player_hand.cards, (self.dealer_up_card,))
+        self.prefetch_recommendations(self.player_hand.cards)
+
+        if log.info_on:
+            log.info("round_started", player=self.nickname, hand=[str(c) for c in self.player_hand], total=self.player_hand.total,
+                     up_card=str(self.dealer_up_card), bet=self.current_bet, capital=self.player_capital)
 
-    elif msg_type == "game_update":
+            #If no blackjack right at the beginning, wait for YOUR_TURN (via game_update)
+            if self.player_hand.is_blackjack:
+                log.info("blackjack", player=self.nickname)
+            elif self.player_hand.is_bust:
+                log.info("bust_at_start", player=self.nickname)
+
+    @register_message("game_update", {"player_id": ("id", True), "all_player_hands": ("hands", False), "dealer_hand": ("cards", False),
+                                      "current_player_turn_id": ("str?", False), "current_player_turn_nickname": ("str?", False),
+                                      "current_hand_index": ("int", False)})
+    def _on_game_update(self, payload, sender_addr):
+        self._croupier_replied(sender_addr)
         #This message signals whose turn it is and provides updated hands
-        if payload.get("player_id") == player_id:
-            all_player_hands_str = payload.get("all_player_hands", [])
-            if all_player_hands_str and all_player_hands_str[0]:
-                player_hand = [_card_from_str(s) for s in all_player_hands_str[0]]
-            
-            dealer_hand_strings = payload.get("dealer_hand", [])
-            dealer_display = []
-            for s in dealer_hand_strings:
-                if s == "HIDDEN":
-                    dealer_display.append("[HIDDEN]")
-                else:
-                    dealer_display.append(s)
-            
-            #Update dealer's up card based on the full dealer hand if available, otherwise keep old
-            if dealer_hand_strings and dealer_hand_strings[0] != "HIDDEN":
-                dealer_up_card = _card_from_str(dealer_hand_strings[0])
-
-
-            print(f"\n--- Spiel-Update ---")
-            print(f"Deine Hand: {[str(c) for c in player_hand]} (Wert: {calculate_hand_value(player_hand)})")
-            print(f"Croupier's Hand: {' '.join(dealer_display)}")
-            print(f"Dein Kapital: {player_capital}")
-
-            current_turn_player_id = payload.get("current_player_turn_id")
-            current_turn_player_nickname = payload.get("current_player_turn_nickname")
-
-            if current_turn_player_id == player_id:
-                player_turn_active = True
-                print(f"\n--- Dein Zug ({nickname}) ---")
-                if calculate_hand_value(player_hand) < 21:
-                    request_recommendation_from_counter() #Request recommendation right away
-                else:
-                    print(f"Handwert ist {calculate_hand_value(player_hand)}. Keine weiteren Aktionen möglich.")
-                    send_player_action_to_croupier("STAND") #Automatically stand if 21 or busted
+        all_player_hands_str = payload.get("all_player_hands", [])
+        if all_player_hands_str and all_player_hands_str[0]:
+            _hands_from_payload(self.player_hands, all_player_hands_str)
+            hand_index = payload.get("current_hand_index", 0) #The hand that is played after a split
+            self.player_hand = self.player_hands[hand_index if 0 <= hand_index < len(self.player_hands) else 0]
+
+        dealer_hand_strings = payload.get("dealer_hand", [])
+        dealer_cards = [_card_from_str(s) for s in dealer_hand_strings]
+        #Update dealer's up card based on the full dealer hand if available, otherwise keep old
+        if dealer_cards and dealer_cards[0] is not None:
+            self.dealer_up_card = dealer_cards[0]
+        self._observe_cards(*(hand.cards for hand in self.player_hands), dealer_cards)
+
+        if log.info_on:
+            log.info("game_update", player=self.nickname, hands=[[str(c) for c in hand] for hand in self.player_hands],
+                     totals=[hand.total for hand in self.player_hands], active=self.player_hands.index(self.player_hand),
+                     dealer=dealer_hand_strings, capital=self.player_capital)
+
+        if payload.get("current_player_turn_id") == self.player_id:
+            self.player_turn_active = True
+            log.info("your_turn", player=self.nickname)
+            if self.player_hand.total < 21:
+                self.request_recommendation() #Request recommendation right away
             else:
-                player_turn_active = False
-                print(f"Es ist der Zug von Spieler: {current_turn_player_nickname}")
-
-
-    elif msg_type == "action_recommendation":
-        recommended_action = payload.get("recommended_action")
+                log.info("no_actions", player=self.nickname, total=self.player_hand.total)
+                self.send_player_action_to_croupier("STAND") #Automatically stand if 21 or busted
+        else:
+            self.player_turn_active = False
+            if payload.get("current_player_turn_id"):
+                self.shoe.other_seat(payload["current_player_turn_id"])
+            log.info("other_turn", player=self.nickname, turn=payload.get('current_player_turn_nickname'))
+
+    @register_message("action_recommendation", {"recommended_action": ("action", True), "expected_value": ("number?", False),
+                                                "player_id": ("id", False), "request_id": ("int", False)}, route="recommendation")
+    def _on_action_recommendation(self, payload, sender_addr):
+        action = payload["recommended_action"]
         expected_value = payload.get("expected_value")
-        print(f"<- Kartenzähler: Empfehlung erhalten: {recommended_action} (EV: {expected_value:.2f})")
-        #If it's our turn and we got a recommendation, we can immediately act
-        if player_turn_active:
-            handle_your_turn_input_prompt(recommended_action)
-
-
-    elif msg_type == "game_result":
-        if payload.get("player_id") == player_id:
-            result = payload.get("result")
-            payout = payload.get("payout")
-            player_hand_final = [_card_from_str(s) for s in payload.get("player_hand", [])]
-            dealer_hand_final = [_card_from_str(s) for s in payload.get("dealer_hand", [])]
-
-            player_capital += payout
-            print(f"Rundenergebnis für {nickname}: {result.upper()}!")
-            print(f"Deine Endhand: {[str(c) for c in player_hand_final]} (Wert: {calculate_hand_value(player_hand_final)})")
-            print(f"Croupier's Endhand: {[str(c) for c in dealer_hand_final]} (Wert: {calculate_hand_value(dealer_hand_final)})")
-            print(f"Auszahlung: {payout}, Neues Kapital: {player_capital}")
-
-            #Reset
-            recommended_action = None
-            game_in_progress = False
-            player_turn_active = False
-            is_betting_phase = True
-            player_hand = []
-            dealer_up_card = None
-            current_bet = 0
-
-            if player_capital <= 0:
-                print("Kapital aufgebraucht. Spiel beendet.")
-            print(f"--- Spiel beendet. Aktuelles Kapital: {player_capital} ---\n")
-
-    elif msg_type == "round_ended":
+        request_id = payload.get("request_id")
+        matched = request_id in self.pending_recommendations
+        if matched:
+            self.counter_echoes_request_id = True
+        elif request_id is not None:
+            metrics.counters["recommendation_stale"] += 1 #answer to a request of a finished round
+            return
+        elif len(self.pending_recommendations) == 1 and not self.counter_echoes_request_id:
+            request_id = next(iter(self.pending_recommendations)) #the only open request
+        else:
+            metrics.counters["recommendation_unmatched"] += 1
+            return
+        key, sent_at = self.pending_recommendations.pop(request_id)
+        _recommendation_requests.pop(request_id, None)
+        elapsed = time.perf_counter() - sent_at
+        metrics.record("recommendation_rtt", elapsed)
+        metrics.record(f"peer_rtt:{sender_addr[0]}:{sender_addr[1]}", elapsed)
+
+        if matched:
+            self.recommendations.put(key, self.shoe.generation, (action, expected_value))
+        if key == self.awaiting_key:
+            self.awaiting_key = None
+            self._handle_recommendation(action, expected_value, "Kartenzähler")
+        if action == "HIT" and key == self.recommendation_key(self.player_hand.cards):
+            for card in _CARDS_BY_VALUE:
+                self.prefetch_recommendations(self.player_hand.cards + [card])
+
+    @register_message("game_result", {"player_id": ("id", True), "result": ("str", True), "payout": ("number", True),
+                                      "player_hand": ("cards", False), "dealer_hand": ("cards", False)})
+    def _on_game_result(self, payload, sender_addr):
+        self._croupier_replied(sender_addr)
+        result = payload["result"]
+        payout = payload["payout"]
+
+        self.player_capital += payout
+        self._settle_stake(payout)
+        player_hand_final = HandState(_card_from_str(s) for s in payload.get("player_hand", []))
+        dealer_hand_final = HandState(_card_from_str(s) for s in payload.get("dealer_hand", []))
+        self._observe_cards(player_hand_final.cards, dealer_hand_final.cards)
+        if log.info_on:
+            log.info("round_result", player=self.nickname, result=result, hand=[str(c) for c in player_hand_final],
+                     total=player_hand_final.total, dealer_hand=[str(c) for c in dealer_hand_final],
+                     dealer_total=dealer_hand_final.total, payout=payout, capital=self.player_capital)
+
+        if self.bet_sent_at is not None:
+            self.round_latencies.append(time.perf_counter() - self.bet_sent_at)
+            self.bet_sent_at = None
+        self.rounds += 1
+
+        self._reset_round()
+        if journal is not None:
+            journal.snapshot(self)
+
+        if self.player_capital <= 0:
+            log.info("capital_exhausted", player=self.nickname)
+        log.info("round_finished", player=self.nickname, capital=self.player_capital)
+
+    @register_message("round_ended", {"player_id": ("id", False)}, route="broadcast") #with player_id only for that seat
+    def _on_round_ended(self, payload, sender_addr):
         #This message indicates the end of a round and readiness for a new one.
-        is_betting_phase = True
-        game_in_progress = False
-        player_turn_active = False
-        player_hand = []
-        dealer_up_card = None
-        current_bet = 0
-        recommended_action = None
-        print("\nBereit für neue Runde. Platziere Einsatz (oder drücke 'q' zum Beenden).")
-
-    elif msg_type == "statistics_response":
-        print(f"Statistiken vom Kartenzähler erhalten: {json.dumps(payload, indent=2)}")
-        if is_betting_phase:
-            print("\nBereit für neue Runde. Platziere Einsatz (oder drücke 'q' zum Beenden).")
-
-    elif msg_type == "reject_bet":
-        print(f"Croupier hat den Einsatz abgelehnt: {payload.get('reason')}")
-        game_in_progress = False
-        is_betting_phase = True #Allow placing another bet
-        player_capital += current_bet #Return the rejected bet to capital
-        current_bet = 0
-
-
-    else:
-        print(f"Unbekannter Nachrichtentyp empfangen: {msg_type}")
-
-
-def place_bet(amount):
-    global current_bet, player_capital, is_betting_phase
-    if amount > player_capital:
-        print(f"Nicht genug Kapital für Einsatz von {amount}. Verfügbar: {player_capital}")
-        return
-
-    current_bet = amount
-    bet_message = {
-        "type": "bet",
-        "payload": {
-            "player_id": player_id,
-            "player_nickname": nickname,
-            "amount": amount,
-            "player_listen_addr": [PLAYER_IP, PLAYER_PORT]
+        self._reset_round()
+        log.info("ready_for_round", player=self.nickname)
+        if self.auto:
+            self.auto_bet()
+
+    @register_message("statistics_response", {"player_id": ("id", False), "requester_id": ("id", False),
+                                              "num_decks": ("decks", False)}, route="broadcast")
+    def _on_statistics_response(self, payload, sender_addr):
+        log.info("statistics", player=self.nickname, statistics=payload)
+        num_decks = payload.get("num_decks")
+        if num_decks is not None and num_decks != self.shoe.num_decks:
+            self.shoe.reset(num_decks) #the counter knows the croupier's deck count
+        if self.is_betting_phase:
+            log.info("ready_for_round", player=self.nickname)
+
+    @register_message("reject_bet", {"player_id": ("id", False), "reason": ("str?", False)})
+    def _on_reject_bet(self, payload, sender_addr):
+        self._croupier_replied(sender_addr)
+        log.warning("bet_rejected", player=self.nickname, reason=payload.get('reason'))
+        self.game_in_progress = False
+        self.is_betting_phase = True #Allow placing another bet
+        self._settle_stake(0) #bets are only deducted by the payout of game_result, a rejected one just frees its reservation
+        self.current_bet = 0
+        self.bet_sent_at = None
+        self.rejected_bets += 1
+        if journal is not None:
+            journal.snapshot(self)
+        if self.auto and not self.finished:
+            if self.rejected_bets < MAX_BET_REJECTIONS:
+                asyncio.get_running_loop().call_later(BET_RETRY, self.auto_bet) #the croupier's limits may differ from ours
+            else:
+                log.warning("bets_rejected", player=self.nickname, count=self.rejected_bets)
+                self._finish()
+
+    #time from our last bet/player_action to the croupier's next message for this seat
+    def _croupier_replied(self, sender_addr):
+        if self.croupier_request is not None:
+            request_type, sent_at = self.croupier_request
+            elapsed = time.perf_counter() - sent_at
+            metrics.record(f"croupier_rtt:{request_type}", elapsed)
+            metrics.record(f"peer_rtt:{sender_addr[0]}:{sender_addr[1]}", elapsed)
+            self.croupier_request = None
+
+    def _reset_round(self):
+        if self.reserved: #the round ended without a game_result for this seat
+            self._settle_stake(0)
+        self.recommended_action = None
+        self._cancel_recommendation_requests()
+        self.awaiting_key = None
+        self._cancel_decision_deadline()
+        self.game_in_progress = False
+        self.player_turn_active = False
+        self.is_betting_phase = True
+        self.player_hands = [HandState()]
+        self.player_hand = self.player_hands[0]
+        self.dealer_up_card = None
+        self.current_bet = 0
+        self.shoe.end_round()
+
+    #observes all cards that are visible in a message
+    def _observe_cards(self, *card_lists):
+        self.shoe.observe(card for cards in card_lists for card in cards)
+
+    #stores a recommendation (from the counter or the local engine) and prompts or acts if it's our turn
+    def _handle_recommendation(self, action, expected_value, source):
+        self.recommended_action = action
+        log.info("recommendation", player=self.nickname, source=source, action=action, ev=expected_value)
+        #If it's our turn and we got a recommendation, we can immediately act
+        if self.player_turn_active:
+            if self.auto:
+                if not self.handle_turn_action(action):
+                    self.handle_turn_action("HIT" if self.player_hand.total < 17 else "STAND")
+            else:
+                self.handle_your_turn_input_prompt(self.recommended_action)
+
+    #sends the bet, returns False if the capital (or the shared bankroll) doesn't cover it
+    def place_bet(self, amount):
+        if not self._can_stake(amount, amount):
+            log.warning("insufficient_capital", player=self.nickname, amount=amount, capital=self.available_capital)
+            return False
+
+        self.current_bet = amount
+        bet_message = {
+            "type": "bet",
+            "payload": {
+                "player_id": self.player_id,
+                "player_nickname": self.nickname,
+                "amount": amount,
+                "player_listen_addr": self.listen_addr
+            }
         }
-    }
-    _send_udp_message(CROUPIER_IP, CROUPIER_PORT, bet_message)
-    print(f"{nickname} platziert Einsatz von {amount}. Warte auf Start der Runde...")
-    is_betting_phase = False #Once bet is placed, not in betting phase anymore
-
-
-def send_player_action_to_croupier(action):
-    global player_turn_active
-    action_message = {
-        "type": "player_action",
-        "payload": {
-            "player_id": player_id,
-            "action": action
+        self.bet_sent_at = time.perf_counter()
+        self.croupier_request = ("bet", self.bet_sent_at)
+        self._send(*self.croupier_addr, bet_message)
+        log.info("bet_placed", player=self.nickname, amount=amount)
+        self.is_betting_phase = False #Once bet is placed, not in betting phase anymore
+        return True
+
+    #bets determine_optimal_bet() for the next round, or finishes the session
+    def auto_bet(self):
+        if self.finished or not self.is_betting_phase:
+            return
+        amount = self.determine_optimal_bet() if not self.max_rounds or self.rounds < self.max_rounds else 0
+        if amount >= TABLE_MIN and self.place_bet(amount): #less than the table minimum would only be rejected
+            return
+        if bankroll is not None and bankroll.reserved > 0 and (not self.max_rounds or self.rounds < self.max_rounds):
+            #other seats hold the rest of the shared bankroll, their rounds settle soon
+            asyncio.get_running_loop().call_later(BANKROLL_RETRY, self.auto_bet)
+            return
+        self._finish()
+
+    def send_player_action_to_croupier(self, action):
+        action_message = {
+            "type": "player_action",
+            "payload": {
+                "player_id": self.player_id,
+                "action": action
+            }
         }
-    }
-    _send_udp_message(CROUPIER_IP, CROUPIER_PORT, action_message)
-    player_turn_active = False #Player's turn ends after sending an action
-
-
-def request_statistics():
-    stats_request_message = {
-        "type": "statistics_request",
-        "payload": {
-            "requester_id": player_id,
-            "requester_listen_addr": [PLAYER_IP, PLAYER_PORT]
+        self.croupier_request = ("player_action", time.perf_counter())
+        self._send(*self.croupier_addr, action_message)
+        self.player_turn_active = False
+        self._cancel_decision_deadline() #Player's turn ends after sending an action
+
+    def request_statistics(self):
+        stats_request_message = {
+            "type": "statistics_request",
+            "payload": {
+                "requester_id": self.player_id,
+                "requester_listen_addr": self.listen_addr
+            }
         }
-    }
-    _send_udp_message(COUNTER_IP, COUNTER_PORT, stats_request_message)
-
+        self._send(*self.counter_addr, stats_request_message)
+
+    #shows the turn and the recommendation, the action itself is entered on the console
+    def handle_your_turn_input_prompt(self, rec_action=None):
+        if not log.info_on:
+            return
+        dealer = dealer_probabilities(self.dealer_up_card.value, self.shoe.composition()) if self.dealer_up_card else None
+        log.info("turn_prompt", player=self.nickname, hand=[str(c) for c in self.player_hand], total=self.player_hand.total,
+                 up_card=str(self.dealer_up_card) if self.dealer_up_card else None, recommendation=rec_action, dealer=dealer)
+
+    #validates and sends an action, returns False if the action is not possible
+    def handle_turn_action(self, action):
+        if action == "AUTO":
+            if not self.recommended_action:
+                log.info("no_recommendation", player=self.nickname)
+                return False
+            log.info("auto_action", player=self.nickname, action=self.recommended_action)
+            action = self.recommended_action
+
+        if action in ("H", "HIT"):
+            self.send_player_action_to_croupier("HIT")
+        elif action in ("S", "STAND"):
+            self.send_player_action_to_croupier("STAND")
+        elif action in ("D", "DOUBLE_DOWN"):
+            #Check conditions for Double Down
+            if self.player_hand.card_count == 2 and self._can_stake(self.current_bet, self.current_bet * 2):
+                self.send_player_action_to_croupier("DOUBLE_DOWN")
+            else:
+                log.info("double_not_possible", player=self.nickname)
+                return False
+        elif action in ("P", "SPLIT"):
+            #Check conditions for Split
+            if self.player_hand.is_pair and self._can_stake(self.current_bet, self.current_bet * 2):
+                self.send_player_action_to_croupier("SPLIT")
+            else:
+                log.info("split_not_possible", player=self.nickname)
+                return False
+        elif action == "SURRENDER":
+            self.send_player_action_to_croupier("SURRENDER")
+        else:
+            log.info("invalid_action", player=self.nickname, action=action)
+            return False
+
+        self.recommended_action = None
+        return True
+
+    #state that survives a restart, journaled when the seat starts and after every settled round
+    def snapshot(self):
+        return {"player_id": self.player_id, "nickname": self.nickname, "capital": self.player_capital,
+                "rounds": self.rounds, "fallbacks": self.fallbacks, "shoe": self.shoe.snapshot()}
+
+    def restore(self, state):
+        self.player_capital = state["capital"]
+        self.rounds = state["rounds"]
+        self.fallbacks = state.get("fallbacks", 0)
+        self.shoe.restore(state["shoe"])
+
+    #rounds/sec and round latency of this seat
+    def report(self):
+        elapsed = time.perf_counter() - self.started_at
+        latencies = sorted(self.round_latencies)
+        mean = sum(latencies) / len(latencies) if latencies else 0.0
+        return (f"{self.nickname}: {self.rounds} Runden, {self.rounds / elapsed:.1f} Runden/s, "
+                f"Latenz Ø {mean * 1000:.2f} ms, p50 {_percentile(latencies, 0.5) * 1000:.2f} ms, "
+                f"p99 {_percentile(latencies, 0.99) * 1000:.2f} ms, Kapital {self.player_capital}, Fallbacks {self.fallbacks}")
+
+
+#validates an incoming message and dispatches it to the session(s) it is meant for
+def _handle_message(message, sender_addr):
+    msg_type = message.get("type") if isinstance(message, dict) else None
+    entry = MESSAGE_HANDLERS.get(msg_type) if isinstance(msg_type, str) else None
+    if entry is None:
+        if not isinstance(msg_type, str):
+            log.warning("unknown_message", ip=sender_addr[0], port=sender_addr[1], type=repr(msg_type))
+            msg_type = None #malformed types are counted together
+        else:
+            log.warning("unknown_message", ip=sender_addr[0], port=sender_addr[1], type=msg_type)
+        message_counters[msg_type][1] += 1
+        return
+    payload = message.get("payload", {})
+    error = entry.validate(payload)
+    if error is not None:
+        message_counters[msg_type][1] += 1
+        log.warning("invalid_message", ip=sender_addr[0], port=sender_addr[1], type=msg_type, error=error)
+        return
 
-def handle_your_turn_input_prompt(rec_action=None):
-    global recommended_action, player_capital, current_bet
+    target_id = payload.get("player_id")
+    if target_id is not None and not isinstance(target_id, str): #every schema checks it, this keeps routing safe
+        message_counters[msg_type][1] += 1
+        log.warning("invalid_message", ip=sender_addr[0], port=sender_addr[1], type=msg_type, error=f"'player_id' ist ungültig: {target_id!r}")
+        return
+    if entry.route == "recommendation" and payload.get("request_id") in _recommendation_requests:
+        targets = (_recommendation_requests[payload["request_id"]],)
+    elif target_id is not None:
+        session = sessions.get(target_id)
+        targets = (session,) if session is not None else ()
+    elif entry.route == "recommendation":
+        #a recommendation without player_id and request_id can only be matched while a single request is open
+        targets = tuple(_recommendation_requests.values()) if len(_recommendation_requests) == 1 else ()
+        if not targets:
+            metrics.counters["recommendation_unmatched"] += 1
+    else:
+        #broadcasts reach the seats of the table (croupier or counter) that sent them, unknown senders reach every seat
+        targets = tuple(s for s in sessions.values() if sender_addr == s.croupier_addr or sender_addr == s.counter_addr)
+        if not targets:
+            targets = tuple(sessions.values())
+
+    if log.debug_on:
+        log.debug("received", ip=sender_addr[0], port=sender_addr[1], type=msg_type, payload=payload)
+    for session in targets:
+        entry.handler(session, payload, sender_addr)
+    message_counters[msg_type][0] += 1
+
+    for callback in _subscribers.get(msg_type, ()):
+        callback(msg_type, payload, sender_addr)
+    for callback in _subscribers.get(None, ()):
+        callback(msg_type, payload, sender_addr)
+
+
+#Batched receive
+#Instead of one read (and one new bytes object) per datagram, every wakeup drains the socket with recvmsg_into into a
+#preallocated buffer of RECV_BATCH slots and hands the batch to the protocol. Datagrams are decoded straight from
+#their memoryview slot, MSG_TRUNC reports datagrams that did not fit into a slot and on Linux SO_RXQ_OVFL reports
+#datagrams the kernel dropped because the socket buffer (--rcvbuf) was full.
+BATCHED_RECEIVE = True #--no-batch uses the datagram transport of asyncio
+RECV_BATCH = 32 #datagrams per wakeup, the selector calls again if more are waiting
+RECV_BUFFER_SIZE = 65536 #bytes per slot, the largest UDP datagram fits
+SOCKET_RCVBUF = 0 #SO_RCVBUF in bytes, 0 keeps the system default
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40 if sys.platform.startswith("linux") else None)
+
+class BatchedReceiver:
+    def __init__(self, sock, protocol, batch=None, size=None):
+        self.sock = sock.dup() #the transport owns the fd of sock, the loop only lets us watch a second fd of the same socket
+        self.protocol = protocol
+        batch = batch or RECV_BATCH
+        size = size or RECV_BUFFER_SIZE
+        self.buffer = bytearray(batch * size)
+        view = memoryview(self.buffer)
+        self.slots = [view[i * size:(i + 1) * size] for i in range(batch)]
+        self.ancillary_size = 0
+        self.kernel_drops = 0 #cumulative count reported by the kernel
+        self.loop = None
+        if SO_RXQ_OVFL is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.ancillary_size = socket.CMSG_SPACE(4)
+            except OSError:
+                pass
 
-    print(f"\n--- Dein Zug ({nickname}) ---")
-    print(f"Deine Hand: {[str(c) for c in player_hand]} (Wert: {calculate_hand_value(player_hand)})")
-    if dealer_up_card:
-        print(f"Croupier's sichtbare Karte: {dealer_up_card}")
-    
-    print("Verfügbare Aktionen: H (Hit), S (Stand), D (Double Down), P (Split), SURRENDER, AUTO")
-    if rec_action:
-        print(f"Empfohlene Aktion vom Kartenzähler: {rec_action}")
-    
-    action = None
-    if rec_action: #If a recommendation is available, suggest using AUTO or the recommendation directly
-        user_choice = input(f"Wähle eine Aktion (H/S/D/P/SURRENDER/AUTO). Empfehlung ist '{rec_action}': ").upper()
-        if user_choice == "AUTO":
-            action = rec_action
+    def start(self, loop):
+        loop.add_reader(self.sock.fileno(), self._drain)
+        self.loop = loop
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.sock.fileno())
+            self.loop = None
+        self.sock.close()
+
+    def _drain(self):
+        if self.protocol.transport is not None and self.protocol.transport.is_closing():
+            #connection_lost only comes with the next loop iteration, nothing may be handled after close()
+            self.stop()
+            return
+        datagrams = []
+        for slot in self.slots:
+            try:
+                nbytes, ancdata, flags, addr = self.sock.recvmsg_into((slot,), self.ancillary_size)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                log.error("receive_error", error=str(e))
+                break
+            for level, kind, data in ancdata:
+                if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL:
+                    drops = int.from_bytes(data[:4], sys.byteorder)
+                    if drops > self.kernel_drops:
+                        metrics.counters["kernel_dropped"] += drops - self.kernel_drops
+                        self.kernel_drops = drops
+            if flags & socket.MSG_TRUNC:
+                metrics.counters["datagrams_truncated"] += 1
+                log.warning("datagram_truncated", ip=addr[0], port=addr[1], size=len(slot))
+                continue
+            datagrams.append((slot[:nbytes], addr))
         else:
-            action = user_choice
-    else:
-        action = input("Wähle eine Aktion (H/S/D/P/SURRENDER): ").upper()
-
-    if action == "H":
-        send_player_action_to_croupier("HIT")
-    elif action == "S":
-        send_player_action_to_croupier("STAND")
-    elif action == "D":
-        #Check conditions for Double Down
-        if len(player_hand) == 2 and player_capital >= current_bet * 2:
-            send_player_action_to_croupier("DOUBLE_DOWN")
+            metrics.counters["receive_batch_full"] += 1
+        if datagrams:
+            metrics.counters["receive_batches"] += 1
+            self.protocol.datagrams_received(datagrams)
+
+
+#Admission
+#Every datagram is checked before it is decoded: only the croupier and counter addresses of the seats (and --allow) are
+#accepted, and every peer has a token bucket of PEER_RATE datagrams/s that holds up to PEER_BURST. Within one drained
+#batch, a game_update that is followed by a newer one for the same seat from the same peer (without deal_cards,
+#game_result or round_ended in between) is superseded and dropped, so a burst of updates costs one handler call.
+ADMISSION_ALLOWLIST = True #--allow-any accepts datagrams from every address
+PEER_RATE = 20000.0 #datagrams per second and peer, 0 disables the rate limit
+PEER_BURST = 2000.0
+REJECTED_PEERS_LOGGED = 1024 #unknown senders that are logged once, later ones are only counted
+_ROUND_BOUNDARIES = frozenset(("deal_cards", "game_result", "round_ended"))
+
+allowed_peers = set() #(ip, port) of the croupiers and counters of all seats, every PlayerSession adds its own
+
+class Admission:
+    def __init__(self):
+        self.buckets = {} #peer -> [tokens, time of the last refill]
+        self.rejected_peers = set()
+
+    def admit(self, peer):
+        if ADMISSION_ALLOWLIST and peer not in allowed_peers:
+            metrics.counters["peer_rejected"] += 1
+            if peer not in self.rejected_peers and len(self.rejected_peers) < REJECTED_PEERS_LOGGED:
+                self.rejected_peers.add(peer)
+                log.warning("peer_rejected", ip=peer[0], port=peer[1])
+            return False
+        if not PEER_RATE:
+            return True
+        now = time.monotonic()
+        bucket = self.buckets.get(peer)
+        if bucket is None:
+            bucket = self.buckets[peer] = [PEER_BURST, now]
+        tokens = min(PEER_BURST, bucket[0] + (now - bucket[1]) * PEER_RATE)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            metrics.counters["rate_limited"] += 1
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+admission = Admission()
+
+#returns the (message, addr) pairs of a batch without the game_updates that a later one in the batch supersedes,
+#malformed messages are passed through untouched, _handle_message rejects them
+def coalesce_updates(batch):
+    latest = {} #(peer, player_id) -> index of the newest game_update since the last round boundary
+    superseded = set()
+    for i, (message, addr) in enumerate(batch):
+        msg_type = message.get("type") if isinstance(message, dict) else None
+        if not isinstance(msg_type, str):
+            continue
+        payload = message.get("payload")
+        player_id = payload.get("player_id") if isinstance(payload, dict) else None
+        if player_id is not None and not isinstance(player_id, str):
+            continue
+        if msg_type == "game_update":
+            previous = latest.get((addr, player_id))
+            if previous is not None:
+                superseded.add(previous)
+            latest[addr, player_id] = i
+        elif msg_type in _ROUND_BOUNDARIES:
+            if player_id is None:
+                latest.clear()
+            else:
+                latest.pop((addr, player_id), None)
+    if not superseded:
+        return batch
+    metrics.counters["game_update_coalesced"] += len(superseded)
+    return [entry for i, entry in enumerate(batch) if i not in superseded]
+
+
+#Session journal
+#With --journal every message the player handles or sends is appended to a binary journal, together with a snapshot of
+#every seat when it starts, after every settled round and at shutdown. A record is a u32 length (of the rest of the
+#record), u8 kind, f64 unix time, u16 port, u8-length-prefixed ip and the body: the message as binary datagram (JSON if
+#it has no exact binary form) or the snapshot as JSON. Records are collected in memory and written as a group every
+#JOURNAL_FLUSH_INTERVAL seconds or JOURNAL_GROUP_BYTES, a crash loses at most the last group. On restart the last
+#snapshot of every seat is restored, Replay.py feeds a journal back through _handle_message.
+JOURNAL_MAGIC = b"BJJ1"
+JOURNAL_IN, JOURNAL_OUT, JOURNAL_SNAPSHOT = 0, 1, 2
+JOURNAL_FLUSH_INTERVAL = 0.05 #seconds between two group writes
+JOURNAL_GROUP_BYTES = 65536 #a fuller buffer is written right away
+JOURNAL_FSYNC = False #--journal-fsync, every group write also waits for the disk
+_JOURNAL_RECORD = struct.Struct("!IBdH")
+
+#returns ([(kind, time, peer, body)], length of the complete records), a record cut off by a crash ends the journal
+def read_journal(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data:
+        return [], 0
+    if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+        raise ValueError(f"{path} ist kein Spieler-Journal")
+    view = memoryview(data)
+    records = []
+    offset = len(JOURNAL_MAGIC)
+    while offset + _JOURNAL_RECORD.size <= len(data):
+        length, kind, timestamp, port = _JOURNAL_RECORD.unpack_from(data, offset)
+        end = offset + 4 + length
+        if length < _JOURNAL_RECORD.size - 3 or end > len(data):
+            break
+        ip_start = offset + _JOURNAL_RECORD.size + 1
+        ip_end = ip_start + data[ip_start - 1]
+        records.append((kind, timestamp, (str(view[ip_start:ip_end], "ascii"), port), view[ip_end:end]))
+        offset = end
+    return records, offset
+
+def decode_journal_body(kind, body):
+    if kind == JOURNAL_SNAPSHOT or body[:1] == b"{":
+        return json.loads(str(body, "utf-8"))
+    return decode_binary(body)
+
+class SessionJournal:
+    def __init__(self, path, fsync=None):
+        self.path = path
+        self.fsync = JOURNAL_FSYNC if fsync is None else fsync
+        self.restored = collections.OrderedDict() #player_id -> last snapshot, in the order the seats were last settled
+        self.truncated = 0
+        try:
+            records, valid_length = read_journal(path)
+        except FileNotFoundError:
+            records, valid_length = [], 0
+        for kind, _, _, body in records:
+            if kind == JOURNAL_SNAPSHOT:
+                state = decode_journal_body(kind, body)
+                self.restored.pop(state["player_id"], None)
+                self.restored[state["player_id"]] = state
+        self.file = open(path, "ab")
+        if self.file.tell() > valid_length: #the tail of a crashed run, new records go after the last complete one
+            self.truncated = self.file.tell() - valid_length
+            self.file.truncate(valid_length)
+            self.file.seek(valid_length)
+        if self.file.tell() == 0:
+            self.file.write(JOURNAL_MAGIC)
+        self.buffer = bytearray()
+        self.records = 0
+        self.groups = 0
+
+    def _append(self, kind, peer, body):
+        ip, port = peer if peer else ("", 0)
+        ip = ip.encode("ascii")
+        self.buffer += _JOURNAL_RECORD.pack(_JOURNAL_RECORD.size - 3 + len(ip) + len(body), kind, time.time(), port)
+        self.buffer.append(len(ip))
+        self.buffer += ip
+        self.buffer += body
+        self.records += 1
+        if len(self.buffer) >= JOURNAL_GROUP_BYTES:
+            self.flush()
+
+    def record_message(self, kind, message, peer):
+        body = encode_binary(message) if isinstance(message, dict) and isinstance(message.get("type"), str) else None
+        if body is None:
+            body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        self._append(kind, peer, body)
+
+    def snapshot(self, session):
+        self._append(JOURNAL_SNAPSHOT, None, json.dumps(session.snapshot(), separators=(",", ":")).encode("utf-8"))
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.file.write(self.buffer)
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.buffer.clear()
+        self.groups += 1
+        metrics.counters["journal_groups"] += 1
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(JOURNAL_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                log.error("journal_write_failed", path=self.path, error=str(e))
+
+    #final snapshot of every seat, then the last group
+    def close(self, sessions_to_snapshot=()):
+        for session in sessions_to_snapshot:
+            self.snapshot(session)
+        self.flush()
+        self.file.close()
+
+journal = None #SessionJournal of --journal
+
+
+#asyncio runtime
+#All game state is only touched by callbacks and tasks of the event loop, so there are no races between receiving and input.
+class PlayerProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.transport = None
+        self.receiver = None #BatchedReceiver that reads instead of the transport
+        self._batch = None #messages of the batch that is being received, handled together after coalescing
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        if self.receiver is not None:
+            self.receiver.stop()
+
+    #data is a memoryview into the receive buffer when it comes from the BatchedReceiver, it is only valid during the call
+    def datagram_received(self, data, addr):
+        metrics.counters["datagrams_received"] += 1
+        metrics.counters["bytes_received"] += len(data)
+        if impairment is not None:
+            impairment.deliver(self._receive, bytes(data), addr)
         else:
-            print("Double Down ist nur mit 2 Karten und ausreichend Kapital möglich.")
-            handle_your_turn_input_prompt(rec_action) #Prompt again
-    elif action == "P":
-        #Check conditions for Split
-        if len(player_hand) == 2 and player_hand[0].rank == player_hand[1].rank and player_capital >= current_bet * 2:
-            send_player_action_to_croupier("SPLIT")
+            self._receive(data, addr)
+
+    def datagrams_received(self, datagrams):
+        if impairment is not None:
+            for data, addr in datagrams:
+                self.datagram_received(data, addr)
+            return
+        self._batch = []
+        try:
+            for data, addr in datagrams:
+                metrics.counters["datagrams_received"] += 1
+                metrics.counters["bytes_received"] += len(data)
+                self._receive(data, addr)
+            batch = coalesce_updates(self._batch)
+        finally:
+            self._batch = None
+        for message, addr in batch:
+            self._handle(message, addr)
+
+    def _receive(self, data, addr):
+        if not admission.admit(addr):
+            return
+        try:
+            message = decode_datagram(data, addr)
+        except (UnicodeDecodeError, json.JSONDecodeError, RecursionError): #RecursionError: nested too deeply
+            metrics.counters["json_decode_failed"] += 1
+            log.warning("json_decode_failed", ip=addr[0], port=addr[1], data=str(data[:200], 'utf-8', errors='ignore'))
+            return
+        except (ValueError, KeyError, IndexError, struct.error) as e:
+            metrics.counters["binary_decode_failed"] += 1
+            log.warning("binary_decode_failed", ip=addr[0], port=addr[1], error=str(e))
+            return
+        #one bad datagram must not cost the rest of its batch
+        try:
+            if RELIABLE:
+                reliable_delivery.on_receive(message, addr, self.transport, self._deliver)
+            else:
+                self._deliver(message, addr)
+        except Exception as e:
+            metrics.counters["receive_failed"] += 1
+            log.error("receive_failed", ip=addr[0], port=addr[1], error=repr(e))
+
+    def _deliver(self, message, addr):
+        if self._batch is not None:
+            self._batch.append((message, addr))
         else:
-            print("Split ist nur mit zwei Karten des gleichen Rangs und ausreichend Kapital möglich.")
-            handle_your_turn_input_prompt(rec_action)
-    elif action == "SURRENDER":
-        send_player_action_to_croupier("SURRENDER")
-    else:
-        print("Ungültige Aktion. Bitte wähle erneut.")
-        handle_your_turn_input_prompt(rec_action)
+            self._handle(message, addr)
+
+    def _handle(self, message, addr):
+        started = time.perf_counter()
+        msg_type = message.get("type") if isinstance(message, dict) else None
+        if not isinstance(msg_type, str):
+            msg_type = None
+        if journal is not None:
+            journal.record_message(JOURNAL_IN, message, addr)
+        try:
+            _handle_message(message, addr)
+        except Exception as e:
+            metrics.counters["handler_failed"] += 1
+            log.error("handler_failed", type=msg_type, error=repr(e))
+        metrics.record(f"handle:{msg_type}", time.perf_counter() - started)
+
+    def error_received(self, exc):
+        log.error("receive_error", error=str(exc))
+
+
+#binds the protocol to an already bound socket, reading through a BatchedReceiver where the platform allows it
+async def open_endpoint(bound_sock):
+    loop = asyncio.get_running_loop()
+    if SOCKET_RCVBUF:
+        bound_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+    metrics.counters["socket_rcvbuf"] = bound_sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    endpoint_transport, protocol = await loop.create_datagram_endpoint(PlayerProtocol, sock=bound_sock)
+    if BATCHED_RECEIVE and hasattr(bound_sock, "recvmsg_into"):
+        endpoint_transport.pause_reading()
+        receiver = BatchedReceiver(bound_sock, protocol)
+        try:
+            receiver.start(loop)
+            protocol.receiver = receiver
+        except NotImplementedError: #e.g. the proactor event loop on Windows
+            receiver.stop()
+            endpoint_transport.resume_reading()
+    return endpoint_transport
+
+
+def _start_console_reader(loop, lines):
+    #input() blocks, so a daemon thread reads the console and hands every line to the event loop.
+    #The thread never touches game state, an empty queue entry (None) signals the end of the input.
+    def read_lines():
+        while True:
+            try:
+                line = sys.stdin.readline()
+            except (OSError, ValueError):
+                line = ""
+            if not line:
+                loop.call_soon_threadsafe(lines.put_nowait, None)
+                return
+            loop.call_soon_threadsafe(lines.put_nowait, line.rstrip("\n"))
 
-    recommended_action = None
+    threading.Thread(target=read_lines, daemon=True).start()
 
 
-#Main Program
-def main_player_loop():
-    global player_capital, current_bet, game_in_progress, player_id, nickname, sock, is_betting_phase, player_turn_active, recommended_action
+async def _read_console_line(lines, prompt_text):
+    log.flush() #the prompt goes below the events that are already queued
+    print(prompt_text, end="", flush=True)
+    line = await lines.get()
+    if line is None:
+        raise EOFError
+    return line
 
-    #Generate a unique player ID and a default nickname
-    player_id = str(uuid.uuid4())
-    nickname = f"Spieler-{player_id[:4]}"
 
-    #Prompt for a nickname
-    user_nickname = input(f"Gib einen Nickname für diesen Spieler ein (default: {nickname}): ").strip()
-    if user_nickname:
-        nickname = user_nickname
+#Main Program
+async def main_player_loop():
+    global transport
+
+    loop = asyncio.get_running_loop()
+    transport = await open_endpoint(sock)
+    lines = asyncio.Queue()
+    _start_console_reader(loop, lines)
+    metrics_task = loop.create_task(_dump_metrics_periodically()) if metrics_file else None
+    journal_task = loop.create_task(journal.flush_periodically()) if journal is not None else None
+
+    #The seat of the last run continues if the journal has one
+    restored = next(reversed(journal.restored.values()), None) if journal is not None else None
+    if restored is not None:
+        player_id, nickname = restored["player_id"], restored["nickname"]
+    else:
+        #Generate a unique player ID and a default nickname
+        player_id = str(uuid.uuid4())
+        nickname = f"Spieler-{player_id[:4]}"
 
-    print(f"Spieler {nickname} ({player_id}) gestartet mit Kapital: {player_capital}")
+        #Prompt for a nickname
+        try:
+            user_nickname = (await _read_console_line(lines, f"Gib einen Nickname für diesen Spieler ein (default: {nickname}): ")).strip()
+        except EOFError:
+            user_nickname = ""
+        if user_nickname:
+            nickname = user_nickname
+
+    session = PlayerSession(player_id, nickname, INITIAL_CAPITAL)
+    sessions[player_id] = session
+    if restored is not None:
+        session.restore(restored)
+        log.info("session_restored", player=nickname, capital=session.player_capital, rounds=session.rounds)
+    if journal is not None:
+        journal.snapshot(session)
+
+    print(f"Spieler {nickname} ({player_id}) gestartet mit Kapital: {session.player_capital}")
     print(f"Lauscht auf {PLAYER_IP}:{PLAYER_PORT}")
     print(f"Croupier: {CROUPIER_IP}:{CROUPIER_PORT}")
     print(f"Kartenzähler: {COUNTER_IP}:{COUNTER_PORT}")
@@ -395,7 +2599,10 @@ def main_player_loop():
     print("\n--- Spieler-Hilfe ---")
     print("Commands außerhalb des Zugs:")
     print("  bet <Menge>    - Platziert eine Wette für die nächste Runde.")
-    print("  stats          - Zeigt Statistiken vom Kartenzähler an.")
+    print("  stats          - Zeigt den lokalen Zählstand und Statistiken vom Kartenzähler an.")
+    print("  source <counter|local> - Empfehlungen vom Kartenzähler oder von der lokalen Strategie-Engine.")
+    print("  metrics        - Zeigt Zähler und Latenzen (Nachrichten, Croupier, Kartenzähler) an.")
+    print("  autoplay <on|off> - Setzt und spielt automatisch (mit --deadline höchstens so lange auf Empfehlungen warten).")
     print("  q              - Beendet das Spiel.")
     print("\nCommands während deines Zugs:")
     print("  H              - Hit (Zieh eine weitere Karte)")
@@ -407,48 +2614,26 @@ def main_player_loop():
     print("--------------------")
     print(f"\nBeginne, indem du 'bet <Menge>' eingibst, {nickname}.")
 
-    #Start a separate thread for listening to incoming messages
-    #This prevents blocking the main thread while waiting for user input
-    def listen_thread():
-        while True:
-            try:
-                data, addr = sock.recvfrom(4096)
-                message = json.loads(data.decode('utf-8'))
-                _handle_message(message, addr)
-            except socket.timeout:
-                #This timeout is for the socket in the listening thread.
-                #The main loop's input() will handle its own blocking.
-                pass
-            except json.JSONDecodeError:
-                print(f"Fehler beim Dekodieren der JSON-Nachricht von {addr}: {data.decode('utf-8', errors='ignore')}")
-            except Exception as e:
-                print(f"Ein Fehler im Empfangsthread ist aufgetreten: {e}")
-
-    import threading
-    listener = threading.Thread(target=listen_thread, daemon=True)
-    listener.start()
-
-
     while True:
         prompt_text = ""
-        if is_betting_phase:
-            prompt_text = f"{nickname}'s Kapital: {player_capital}. Bereit für neue Runde. Befehl? (bet <Menge>, stats, q): "
-        elif player_turn_active:
-            rec_str = f"Empfehlung: {recommended_action}. " if recommended_action else ""
+        if session.is_betting_phase:
+            prompt_text = f"{nickname}'s Kapital: {session.player_capital}. Bereit für neue Runde. Befehl? (bet <Menge>, stats, metrics, q): "
+        elif session.player_turn_active:
+            rec_str = f"Empfehlung: {session.recommended_action}. " if session.recommended_action else ""
             prompt_text = f"{nickname}'s Hand ist am Zug. {rec_str}Aktion? (H, S, D, P, SURRENDER, AUTO, stats, q): "
         else:
-            prompt_text = "Warte auf meinen Zug... (stats, q): "
+            prompt_text = "Warte auf meinen Zug... (stats, metrics, q): "
 
         try:
-            user_input = input(prompt_text).strip().upper()
+            user_input = (await _read_console_line(lines, prompt_text)).strip().upper()
 
             #Handle actions of user
             if user_input.startswith('BET '):
-                if is_betting_phase:
+                if session.is_betting_phase:
                     try:
                         amount = int(user_input.split(' ')[1])
                         if amount > 0:
-                            place_bet(amount)
+                            session.place_bet(amount)
                         else:
                             print("Einsatz muss positiv sein.")
                     except (IndexError, ValueError):
@@ -457,66 +2642,270 @@ def main_player_loop():
                     print("Kann jetzt keine Wette platzieren. Spiel ist im Gange.")
 
             elif user_input == 'STATS':
-                request_statistics()
+                shoe = session.shoe
+                log.info("shoe_state", remaining=shoe.remaining, running_count=shoe.running_count, true_count=shoe.true_count, edge=shoe.edge)
+                log.info("dealer_outcomes", rule="H17" if DEALER_HITS_SOFT_17 else "S17", remaining=shoe.remaining,
+                         table=dealer_outcomes.table(shoe.composition()))
+                session.request_statistics()
+
+            elif user_input == 'METRICS':
+                log.flush()
+                print(metrics.render())
+
+            elif user_input.startswith('AUTOPLAY'):
+                mode = user_input[len('AUTOPLAY'):].strip()
+                if mode in ('ON', 'OFF'):
+                    session.auto = mode == 'ON'
+                    print(f"Automatisches Spiel: {'an' if session.auto else 'aus'}")
+                    if session.auto and session.is_betting_phase:
+                        session.auto_bet()
+                    elif session.auto and session.player_turn_active:
+                        session.request_recommendation()
+                else:
+                    print("Verwende 'autoplay on' oder 'autoplay off'.")
+
+            elif user_input.startswith('SOURCE'):
+                source = user_input[len('SOURCE'):].strip().lower()
+                if source in ('counter', 'local'):
+                    session.recommendation_source = source
+                    print(f"Empfehlungsquelle: {session.recommendation_source}")
+                else:
+                    print("Ungültige Quelle. Verwende 'source counter' oder 'source local'.")
 
             elif user_input == 'Q':
                 print("Spiel beendet.")
                 break
-            
-            elif player_turn_active and user_input in ['H', 'S', 'D', 'P', 'SURRENDER']:
-                print(f"Manuelle Aktion gesendet für {nickname}: {user_input}")
-                send_player_action_to_croupier(user_input)
-                recommended_action = None #Clear recommendation after manual action
-
-            elif player_turn_active and user_input == 'AUTO':
-                if recommended_action:
-                    print(f"Führe empfohlene Aktion für {nickname} aus: {recommended_action}")
-                    send_player_action_to_croupier(recommended_action)
-                    recommended_action = None
-                else:
-                    print("Keine ausstehende Empfehlung, um 'auto' auszuführen.")
+
+            elif session.player_turn_active and user_input in ['H', 'S', 'D', 'P', 'SURRENDER', 'AUTO']:
+                session.handle_turn_action(user_input)
 
             else:
                 print("Ungültige Eingabe oder nicht dein Zug. Bitte beachte die Hilfe oben.")
 
-            time.sleep(0.1) #Small sleep to prevent busy-waiting too much
-
         except EOFError: #Handles Ctrl+D or similar
             print("\nEingabe beendet. Spieler wird heruntergefahren.")
             break
-        except KeyboardInterrupt:
-            print(f"\n{nickname} wird heruntergefahren.")
-            break
         except Exception as e:
             print(f"Ein Fehler im Hauptloop ist aufgetreten: {e}")
 
-
+    if metrics_task is not None:
+        metrics_task.cancel()
+        metrics.dump(metrics_file)
+    if journal_task is not None:
+        journal_task.cancel()
+        journal.close(sessions.values())
+    transport.close()
+
+
+#Headless bot mode
+_all_sessions_finished = None #asyncio.Event, set when every bot session is finished
+
+def _on_session_finished():
+    if _all_sessions_finished is not None and all(s.finished for s in sessions.values()):
+        _all_sessions_finished.set()
+
+def _print_bot_summary(bots):
+    log.flush()
+    rounds = sum(s.rounds for s in bots)
+    latencies = sorted(l for s in bots for l in s.round_latencies)
+    elapsed = max(time.perf_counter() - min(s.started_at for s in bots), 1e-9)
+    print(f"[{len(bots)} Bots] {rounds} Runden, {rounds / elapsed:.1f} Runden/s, "
+          f"Latenz p50 {_percentile(latencies, 0.5) * 1000:.2f} ms, p99 {_percentile(latencies, 0.99) * 1000:.2f} ms, "
+          f"aktiv: {sum(not s.finished for s in bots)}")
+
+#runs count independent sessions that bet and play automatically, sharing num_sockets sockets.
+#tables is a list of (croupier_addr, counter_addr, seats) to spread the bots over several tables (Supervisor.py),
+#by default all count bots play at CROUPIER_IP:CROUPIER_PORT.
+async def run_bots(count, num_sockets=1, max_rounds=0, duration=0, source="local", report=True, tables=None):
+    global _all_sessions_finished
+
+    loop = asyncio.get_running_loop()
+    _all_sessions_finished = asyncio.Event()
+    endpoints = []
+    for i in range(max(1, min(num_sockets, count))):
+        bot_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        bot_sock.bind((PLAYER_IP, PLAYER_PORT + i if PLAYER_PORT else 0))
+        bot_transport = await open_endpoint(bot_sock)
+        endpoints.append((bot_transport, [PLAYER_IP, bot_sock.getsockname()[1]]))
+
+    #bots of the last run continue by nickname if the journal has them
+    restored = {state["nickname"]: state for state in journal.restored.values()} if journal is not None else {}
+    seat_tables = [(croupier_addr, counter_addr) for croupier_addr, counter_addr, seats in tables or () for _ in range(seats)]
+    bots = []
+    for n in range(count):
+        via, listen_addr = endpoints[n % len(endpoints)]
+        croupier_addr, counter_addr = seat_tables[n] if n < len(seat_tables) else (None, None)
+        nickname = f"Bot-{n + 1}"
+        state = restored.get(nickname)
+        player_id = state["player_id"] if state is not None else str(uuid.uuid4())
+        bot = PlayerSession(player_id, nickname, INITIAL_CAPITAL, via, listen_addr, auto=True, max_rounds=max_rounds,
+                            croupier_addr=croupier_addr, counter_addr=counter_addr)
+        bot.recommendation_source = source
+        if state is not None:
+            bot.restore(state)
+            log.info("session_restored", player=nickname, capital=bot.player_capital, rounds=bot.rounds)
+        if journal is not None:
+            journal.snapshot(bot)
+        sessions[player_id] = bot
+        bot.join_bankroll()
+        bots.append(bot)
+    if report:
+        print(f"{count} Bots gestartet auf {len(endpoints)} Socket(s), Croupier: {CROUPIER_IP}:{CROUPIER_PORT}")
+    metrics_task = loop.create_task(_dump_metrics_periodically()) if metrics_file else None
+    journal_task = loop.create_task(journal.flush_periodically()) if journal is not None else None
+    for bot in bots:
+        bot.auto_bet()
+
+    deadline = loop.time() + duration if duration else None
+    while not _all_sessions_finished.is_set():
+        timeout = REPORT_INTERVAL if deadline is None else min(REPORT_INTERVAL, deadline - loop.time())
+        if timeout <= 0:
+            break
+        try:
+            await asyncio.wait_for(_all_sessions_finished.wait(), timeout)
+        except asyncio.TimeoutError:
+            if report:
+                _print_bot_summary(bots)
+
+    for bot in bots:
+        bot.leave_bankroll()
+    log.flush()
+    if metrics_task is not None:
+        metrics_task.cancel()
+        metrics.dump(metrics_file)
+    if journal_task is not None:
+        journal_task.cancel()
+        journal.close(bots)
+    if report:
+        print("\n--- Bot-Bericht ---")
+        for bot in bots:
+            print(bot.report())
+        _print_bot_summary(bots)
+        print(metrics.render())
+
+    for bot_transport, _ in endpoints:
+        bot_transport.close()
+    return bots
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Blackjack-Spieler")
+    parser.add_argument("player_ip")
+    parser.add_argument("player_port", type=int)
+    parser.add_argument("croupier_ip")
+    parser.add_argument("croupier_port", type=int)
+    parser.add_argument("counter_ip")
+    parser.add_argument("counter_port", type=int)
+    parser.add_argument("initial_capital", type=int)
+    parser.add_argument("--bots", type=int, default=0, help="Anzahl headless Bot-Spieler (0 = interaktiv)")
+    parser.add_argument("--sockets", type=int, default=1, help="Anzahl Sockets, die sich die Bots teilen")
+    parser.add_argument("--rounds", type=int, default=0, help="Runden pro Bot (0 = unbegrenzt)")
+    parser.add_argument("--duration", type=float, default=0, help="Laufzeit der Bots in Sekunden (0 = unbegrenzt)")
+    parser.add_argument("--decks", type=int, default=NUM_DECKS, choices=range(1, MAX_DECKS + 1), help="Anzahl Kartendecks im Schuh des Croupiers")
+    parser.add_argument("--table-min", type=int, default=TABLE_MIN, help="Minimaler Einsatz am Tisch")
+    parser.add_argument("--table-max", type=int, default=TABLE_MAX, help="Maximaler Einsatz am Tisch")
+    parser.add_argument("--cut-card", type=float, default=CUT_CARD, help="Anteil des Schuhs hinter der Schnittkarte (Croupier mischt danach neu)")
+    parser.add_argument("--binary", action="store_true", help="Binäres Nachrichtenformat mit Croupier/Kartenzähler aushandeln")
+    parser.add_argument("--reliable", action="store_true", help="Sequenznummern, ACKs und Wiederholungen (Croupier/Kartenzähler müssen ACKs senden)")
+    parser.add_argument("--loss", type=float, default=0.0, help="Test: Anteil verworfener Pakete (senden und empfangen)")
+    parser.add_argument("--duplicate", type=float, default=0.0, help="Test: Anteil doppelt zugestellter Pakete")
+    parser.add_argument("--reorder", type=float, default=0.0, help="Test: maximale zufällige Verzögerung in Sekunden")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, help="Ab welcher Stufe Ereignisse ausgegeben werden (Standard: info, Bots: warning)")
+    parser.add_argument("--log-format", choices=("console", "json"), default="console", help="Deutsche Konsolenausgabe oder JSON-Lines")
+    parser.add_argument("--log-file", help="Ereignisse in diese Datei statt auf die Konsole schreiben")
+    parser.add_argument("--source", choices=("counter", "local"), default="local", help="Empfehlungsquelle der Bots")
+    parser.add_argument("--no-prefetch", action="store_true", help="Empfehlungen erst im eigenen Zug beim Kartenzähler anfragen")
+    parser.add_argument("--deadline", type=float, default=DECISION_DEADLINE, help="Automatisches Spiel: Sekunden bis zur Basisstrategie, wenn keine Empfehlung kommt (0 = warten)")
+    parser.add_argument("--rcvbuf", type=int, default=SOCKET_RCVBUF, help="Empfangspuffer des Sockets in Bytes (0 = Systemstandard)")
+    parser.add_argument("--recv-batch", type=int, default=RECV_BATCH, help="Pakete, die pro Aufwachen gelesen werden")
+    parser.add_argument("--no-batch", action="store_true", help="Pakete einzeln über den asyncio-Transport empfangen")
+    parser.add_argument("--allow", action="append", default=[], metavar="IP:PORT", help="Weitere Absender annehmen (neben Croupier und Kartenzähler)")
+    parser.add_argument("--allow-any", action="store_true", help="Pakete von allen Absendern annehmen")
+    parser.add_argument("--peer-rate", type=float, default=PEER_RATE, help="Pakete pro Sekunde und Absender (0 = unbegrenzt)")
+    parser.add_argument("--peer-burst", type=float, default=PEER_BURST, help="Pakete, die ein Absender auf einmal schicken darf")
+    parser.add_argument("--journal", help="Alle Nachrichten und Zustände an dieses Journal anhängen und den letzten Zustand beim Start wiederherstellen")
+    parser.add_argument("--journal-fsync", action="store_true", help="Jede Schreibgruppe des Journals auf die Platte zwingen")
+    parser.add_argument("--metrics-file", help="Metriken regelmäßig als JSON-Lines an diese Datei anhängen")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_INTERVAL, help="Sekunden zwischen zwei Metrik-Dumps")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 8:
-        print(f"Usage: python Spieler.py <PLAYER_IP> <PLAYER_PORT> <CROUPIER_IP> <CROUPIER_PORT> <COUNTER_IP> <COUNTER_PORT> <INITIAL_CAPITAL>")
+    args = _parse_args(sys.argv[1:])
+
+    PLAYER_IP = args.player_ip
+    PLAYER_PORT = args.player_port
+    #Resolved once, so the addresses compare equal to the sender addresses of incoming datagrams
+    CROUPIER_IP = socket.gethostbyname(args.croupier_ip)
+    CROUPIER_PORT = args.croupier_port
+    COUNTER_IP = socket.gethostbyname(args.counter_ip)
+    COUNTER_PORT = args.counter_port
+    INITIAL_CAPITAL = args.initial_capital
+    NUM_DECKS = args.decks
+    TABLE_MIN = args.table_min
+    TABLE_MAX = args.table_max
+    CUT_CARD = args.cut_card
+    BINARY_WIRE = args.binary
+    RELIABLE = args.reliable
+    log.set_level(LOG_LEVELS[args.log_level or ("warning" if args.bots > 0 else "info")])
+    log.json_lines = args.log_format == "json"
+    if args.log_file:
+        log.stream = open(args.log_file, "a", encoding="utf-8")
+    metrics_file = args.metrics_file
+    PREFETCH = not args.no_prefetch
+    DECISION_DEADLINE = args.deadline
+    SOCKET_RCVBUF = args.rcvbuf
+    RECV_BATCH = max(1, args.recv_batch)
+    BATCHED_RECEIVE = not args.no_batch
+    METRICS_INTERVAL = args.metrics_interval
+    ADMISSION_ALLOWLIST = not args.allow_any
+    PEER_RATE = args.peer_rate
+    PEER_BURST = max(1.0, args.peer_burst)
+    for peer in args.allow:
+        ip, _, port = peer.rpartition(":")
+        try:
+            allowed_peers.add((socket.gethostbyname(ip), int(port)))
+        except (OSError, ValueError) as e:
+            print(f"Fehler: Ungültiger Absender {peer} für --allow. {e}")
+            sys.exit()
+    if args.loss or args.duplicate or args.reorder:
+        impairment = NetworkImpairment(args.loss, args.duplicate, args.reorder)
+    if args.journal:
+        try:
+            journal = SessionJournal(args.journal, args.journal_fsync)
+        except (OSError, ValueError) as e:
+            print(f"Fehler: Journal {args.journal} kann nicht geöffnet werden. {e}")
+            sys.exit()
+        if journal.truncated:
+            log.warning("journal_truncated", path=args.journal, size=journal.truncated)
+
+    if args.bots > 0:
+        try:
+            asyncio.run(run_bots(args.bots, args.sockets, args.rounds, args.duration, args.source))
+        except OSError as e:
+            print(f"Fehler: Bots konnten nicht an {PLAYER_IP}:{PLAYER_PORT} binden. {e}")
+        except KeyboardInterrupt:
+            print("\nBots werden heruntergefahren.")
+        if journal is not None and not journal.file.closed:
+            journal.close(sessions.values())
+        log.flush()
         sys.exit()
-    
-    PLAYER_IP = sys.argv[1]
-    PLAYER_PORT = int(sys.argv[2])
-    CROUPIER_IP = sys.argv[3]
-    CROUPIER_PORT = int(sys.argv[4])
-    COUNTER_IP = sys.argv[5]
-    COUNTER_PORT = int(sys.argv[6])
-    INITIAL_CAPITAL = int(sys.argv[7])
-    player_capital = INITIAL_CAPITAL
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
         sock.bind((PLAYER_IP, PLAYER_PORT))
-        sock.settimeout(1) #Short timeout for the recvfrom in the listener thread
     except OSError as e:
         print(f"Fehler: Spieler konnte nicht an {PLAYER_IP}:{PLAYER_PORT} binden. {e}")
         print("Bitte stelle sicher, dass dieser Port nicht bereits von einer anderen Instanz verwendet wird.")
         sys.exit()
 
-    main_player_loop()
+    try:
+        asyncio.run(main_player_loop())
+    except KeyboardInterrupt:
+        print("\nSpieler wird heruntergefahren.")
+    if journal is not None and not journal.file.closed:
+        journal.close(sessions.values())
 
     if sock:
-        sock.close()
\ No newline at end of file
+        sock.close()
+    log.flush()
@@ -0,0 +1,246 @@
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import multiprocessing
+import concurrent.futures
+
+import Spieler
+import Testumgebung
+
+#Runs the bot seats of many tables across a process pool, one event loop per worker process.
+#The tables come from a JSON config (or --stand-ins starts local stand-in tables from Testumgebung.py):
+#  {"bankroll": 10000, "player_ip": "127.0.0.1",
+#   "tables": [{"name": "Tisch 1", "croupier": ["127.0.0.1", 9000], "counter": ["127.0.0.1", 9001], "seats": 3}, ...]}
+#All seats stake from one shared bankroll: a bet (or double/split) is reserved under a lock before it is sent and settled
+#with the net payout of game_result, so the seats together can never stake more than the bankroll holds.
+#Every worker counts the finished rounds of its tables in a shared array, the supervisor reports rounds/s per table.
+
+
+class SharedBankroll:
+    def __init__(self, capital):
+        self.lock = multiprocessing.Lock()
+        self._available = multiprocessing.Value('d', capital, lock=False)
+        self._reserved = multiprocessing.Value('d', 0.0, lock=False)
+        self._seats = multiprocessing.Value('i', 0, lock=False) #seats that are playing, each bets against its share
+
+    @property
+    def available(self):
+        return self._available.value
+
+    @property
+    def reserved(self):
+        return self._reserved.value
+
+    @property
+    def seats(self):
+        return self._seats.value
+
+    def join(self):
+        with self.lock:
+            self._seats.value += 1
+
+    def leave(self):
+        with self.lock:
+            self._seats.value -= 1
+
+    def reserve(self, amount):
+        with self.lock:
+            if amount > self._available.value:
+                return False
+            self._available.value -= amount
+            self._reserved.value += amount
+            return True
+
+    #returns the reserved stake and books the net payout (negative if the round was lost)
+    def settle(self, reserved, payout):
+        with self.lock:
+            self._reserved.value -= reserved
+            self._available.value += reserved + payout
+
+
+#Worker process
+_progress = None #multiprocessing.Array, finished rounds per table
+
+def _init_worker(bankroll, progress, options):
+    global _progress
+    _progress = progress
+    Spieler.bankroll = bankroll
+    Spieler.INITIAL_CAPITAL = 0 #player_capital of a seat is its result, the stakes come from the bankroll
+    Spieler.PLAYER_IP, Spieler.PLAYER_PORT = options["player_ip"], 0
+    Spieler.BINARY_WIRE = options["binary"]
+    Spieler.RELIABLE = options["reliable"]
+    Spieler.DECISION_DEADLINE = options["deadline"]
+    Spieler.log.set_level(Spieler.LOG_LEVELS[options["log_level"]])
+
+async def _play_tables(tables, options):
+    index_by_croupier = {table["croupier"]: table["index"] for table in tables}
+
+    def count_round(msg_type, payload, sender_addr):
+        index = index_by_croupier.get(sender_addr)
+        if index is not None:
+            _progress[index] += 1 #every table is played by exactly one worker, so no lock is needed
+
+    Spieler.subscribe("game_result", count_round)
+    started = time.perf_counter()
+    bots = await Spieler.run_bots(sum(table["seats"] for table in tables), len(tables), options["rounds"],
+                                  options["duration"], options["source"], report=False,
+                                  tables=[(table["croupier"], table["counter"], table["seats"]) for table in tables])
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    results = []
+    for table in tables:
+        seats = [bot for bot in bots if bot.croupier_addr == table["croupier"]]
+        latencies = sorted(l for bot in seats for l in bot.round_latencies)
+        rounds = sum(bot.rounds for bot in seats)
+        results.append({
+            "index": table["index"],
+            "name": table["name"],
+            "seats": len(seats),
+            "rounds": rounds,
+            "rounds_per_sec": rounds / elapsed,
+            "p50_ms": Spieler._percentile(latencies, 0.5) * 1000,
+            "p99_ms": Spieler._percentile(latencies, 0.99) * 1000,
+            "result": sum(bot.player_capital for bot in seats),
+        })
+    return results
+
+def _run_worker(tables, options):
+    try:
+        return asyncio.run(_play_tables(tables, options))
+    finally:
+        Spieler.log.flush()
+
+
+#Local stand-in tables (--stand-ins), one process per table so the stand-ins don't share a core with each other
+def _serve_stand_in(ip, seats, reliable, binary, ports):
+    Spieler.BINARY_WIRE = binary
+    Spieler.log.set_level(Spieler.ERROR)
+
+    async def serve():
+        croupier, counter = await Testumgebung.start_stand_ins(ip, seats_per_table=seats, reliable=reliable)
+        ports.put((croupier.transport.get_extra_info("sockname")[1], counter.transport.get_extra_info("sockname")[1]))
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+def start_stand_in_tables(count, ip, seats, reliable, binary):
+    ports = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_serve_stand_in, args=(ip, seats, reliable, binary, ports), daemon=True)
+                 for _ in range(count)]
+    for process in processes:
+        process.start()
+    tables = []
+    for n in range(count):
+        croupier_port, counter_port = ports.get(timeout=10)
+        tables.append({"name": f"Tisch {n + 1}", "croupier": [ip, croupier_port], "counter": [ip, counter_port], "seats": seats})
+    return tables, processes
+
+
+def load_config(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+#resolves the addresses once, so they compare equal to the sender addresses of incoming datagrams
+def _prepare_tables(tables):
+    prepared = []
+    for index, table in enumerate(tables):
+        croupier_ip, croupier_port = table["croupier"]
+        counter_ip, counter_port = table["counter"]
+        prepared.append({"index": index, "name": table.get("name", f"Tisch {index + 1}"), "seats": int(table.get("seats", 1)),
+                         "croupier": (socket.gethostbyname(croupier_ip), int(croupier_port)),
+                         "counter": (socket.gethostbyname(counter_ip), int(counter_port))})
+    return prepared
+
+def supervise(tables, bankroll_capital, workers, options, interval=None):
+    tables = _prepare_tables(tables)
+    workers = max(1, min(workers, len(tables)))
+    bankroll = SharedBankroll(bankroll_capital)
+    progress = multiprocessing.Array('q', len(tables), lock=False)
+    interval = interval or Spieler.REPORT_INTERVAL
+
+    print(f"{len(tables)} Tische mit {sum(t['seats'] for t in tables)} Plätzen auf {workers} Prozessen, Bankroll {bankroll_capital}")
+    started = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                initargs=(bankroll, progress, options)) as pool:
+        futures = [pool.submit(_run_worker, tables[n::workers], options) for n in range(workers)]
+        last_counts, last_time = [0] * len(tables), started
+        while True:
+            done, pending = concurrent.futures.wait(futures, timeout=interval)
+            if not pending:
+                break
+            now = time.perf_counter()
+            counts = list(progress)
+            rates = [(count - last) / (now - last_time) for count, last in zip(counts, last_counts)]
+            print(f"[{now - started:5.0f} s] {sum(rates):8.1f} Runden/s | "
+                  + " ".join(f"{table['name']}: {rate:.0f}/s" for table, rate in zip(tables, rates))
+                  + f" | Bankroll frei {bankroll.available:.1f}, reserviert {bankroll.reserved:.1f}", flush=True)
+            last_counts, last_time = counts, now
+        results = sorted((result for future in futures for result in future.result()), key=lambda result: result["index"])
+    elapsed = time.perf_counter() - started
+    return results, bankroll, elapsed
+
+
+def _format(result):
+    return (f"{result['name']:<12} {result['seats']:>6} {result['rounds']:>8} {result['rounds_per_sec']:>10.1f} "
+            f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['result']:>+10.1f}")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Spielt viele Tische parallel auf mehreren Prozessen mit gemeinsamer Bankroll")
+    parser.add_argument("config", nargs="?", help="JSON-Konfiguration mit Bankroll und Tischen (Croupier, Kartenzähler, Plätze)")
+    parser.add_argument("--stand-ins", type=int, default=0, help="Statt der Konfiguration so viele lokale Ersatz-Tische starten")
+    parser.add_argument("--seats", type=int, default=7, help="Plätze je Ersatz-Tisch")
+    parser.add_argument("--bankroll", type=float, help="Gemeinsame Bankroll (überschreibt die Konfiguration)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="Anzahl Prozesse")
+    parser.add_argument("--rounds", type=int, default=0, help="Runden pro Platz (0 = nur --duration)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Laufzeit in Sekunden (0 = unbegrenzt)")
+    parser.add_argument("--interval", type=float, default=Spieler.REPORT_INTERVAL, help="Sekunden zwischen zwei Zwischenberichten")
+    parser.add_argument("--source", choices=("counter", "local"), default="local", help="Empfehlungsquelle der Plätze")
+    parser.add_argument("--deadline", type=float, default=Spieler.DECISION_DEADLINE, help="Sekunden bis zur Basisstrategie, wenn keine Empfehlung kommt (0 = warten)")
+    parser.add_argument("--binary", action="store_true", help="Binäres Nachrichtenformat")
+    parser.add_argument("--reliable", action="store_true", help="ACKs und Wiederholungen")
+    parser.add_argument("--log-level", choices=Spieler.LOG_LEVELS, default="warning")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args(sys.argv[1:])
+    if not args.config and not args.stand_ins:
+        print("Fehler: Konfiguration oder --stand-ins angeben.")
+        sys.exit(2)
+
+    config = load_config(args.config) if args.config else {}
+    player_ip = config.get("player_ip", "127.0.0.1")
+    stand_ins = []
+    if args.stand_ins:
+        config["tables"], stand_ins = start_stand_in_tables(args.stand_ins, player_ip, args.seats, args.reliable, args.binary)
+    bankroll_capital = args.bankroll if args.bankroll is not None else config.get("bankroll", 1000 * sum(
+        table.get("seats", 1) for table in config["tables"]))
+    options = {"player_ip": player_ip, "rounds": args.rounds, "duration": args.duration, "source": args.source,
+               "deadline": args.deadline, "binary": args.binary, "reliable": args.reliable, "log_level": args.log_level}
+
+    try:
+        results, bankroll, elapsed = supervise(config["tables"], bankroll_capital, args.workers, options, args.interval)
+    except KeyboardInterrupt:
+        print("\nSupervisor wird heruntergefahren.")
+        sys.exit()
+    finally:
+        for process in stand_ins:
+            process.terminate()
+
+    print(f"\n{'Tisch':<12} {'Plätze':>6} {'Runden':>8} {'Runden/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'Ergebnis':>10}")
+    for result in results:
+        print(_format(result))
+    rounds = sum(result["rounds"] for result in results)
+    total = sum(result["result"] for result in results)
+    print(f"Gesamt: {rounds} Runden in {elapsed:.1f} s ({rounds / elapsed:.1f} Runden/s), Ergebnis {total:+.1f}")
+    #stakes of rounds that were still running at the end stay reserved
+    consistent = abs(bankroll.available + bankroll.reserved - (bankroll_capital + total)) < 1e-6
+    print(f"Bankroll: {bankroll.available:.1f} frei, {bankroll.reserved:.1f} in laufenden Runden (Start {bankroll_capital:.1f}) "
+          f"{'konsistent' if consistent else 'INKONSISTENT'}")
@@ -0,0 +1,444 @@
+import sys
+import random
+import struct
+import asyncio
+import argparse
+import collections
+
+import Spieler
+from Spieler import HandState, Card, SUITS, RANKS, log
+
+#Stand-in croupier and counter for local tests and benchmarks.
+#They speak the same messages as the real programs (bet, deal_cards, game_update, player_action, game_result, round_ended,
+#reject_bet, recommendation_request, action_recommendation, statistics_request, statistics_response) over UDP, use the
+#wire format of Spieler.py (JSON, or binary when the player negotiates it) and acknowledge/retransmit with --reliable.
+#The network impairment of Spieler.py only applies to the player side, so every datagram is impaired once.
+
+BET_WINDOW = 0.2 #seconds a table waits for missing bets before the round starts without them
+ACTION_TIMEOUT = 2.0 #seconds until a seat that does not act stands automatically
+PENETRATION = 0.75
+ANNOUNCE_RESHUFFLE = True #--silent-reshuffle deals the first round of a new shoe without "reshuffled", like a croupier that doesn't send it
+
+Spieler.CONSOLE_TEMPLATES["action_timeout"] = "Testumgebung: {player} hat nach {timeout} s nicht gehandelt, STAND."
+
+
+class _DirectDelivery(Spieler.ReliableDelivery):
+    record_metrics = False
+
+    def _send_datagram(self, via, data, peer):
+        via.sendto(data, peer)
+
+
+#common UDP handling of the stand-ins: decoding, acknowledgements, counting
+class _StandInProtocol(asyncio.DatagramProtocol):
+    def __init__(self, reliable=False):
+        self.reliable = _DirectDelivery() if reliable else None
+        self.transport = None
+        self.received = 0
+        self.sent = 0
+        self.message_counts = collections.Counter()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        try:
+            message = Spieler.decode_datagram(data, addr)
+        except (UnicodeDecodeError, ValueError, KeyError, IndexError, struct.error) as e:
+            log.warning("binary_decode_failed", ip=addr[0], port=addr[1], error=str(e))
+            return
+        if self.reliable is not None:
+            self.reliable.on_receive(message, addr, self.transport, self._dispatch)
+        else:
+            self._dispatch(message, addr)
+
+    def _dispatch(self, message, addr):
+        msg_type = message.get("type")
+        payload = message.get("payload")
+        self.message_counts[msg_type] += 1
+        handler = getattr(self, f"_on_{msg_type}", None)
+        if handler is None or not isinstance(payload, dict):
+            log.warning("unknown_message", ip=addr[0], port=addr[1], type=msg_type)
+            return
+        try:
+            handler(payload, addr)
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning("invalid_message", ip=addr[0], port=addr[1], type=msg_type, error=repr(e))
+
+    def send(self, message_dict, peer):
+        peer = tuple(peer)
+        self.sent += 1
+        if self.reliable is not None:
+            self.reliable.send(message_dict, peer, self.transport)
+        else:
+            self.transport.sendto(Spieler.encode_message(message_dict, peer), peer)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class StandInCounter(_StandInProtocol):
+    def __init__(self, num_decks=None, reliable=False):
+        super().__init__(reliable)
+        self.num_decks = num_decks or Spieler.NUM_DECKS
+        self.shoe = Spieler.full_shoe(self.num_decks)
+        self.games = 0
+        self.wins = 0
+        self.blackjacks = 0
+        self.cards_used = collections.Counter()
+
+    #called by the croupier for every card that becomes visible and every finished hand
+    def observe(self, cards):
+        for card in cards:
+            self.cards_used[str(card)] += 1
+
+    def record_result(self, result):
+        self.games += 1
+        if result in ("win", "blackjack"):
+            self.wins += 1
+        if result == "blackjack":
+            self.blackjacks += 1
+
+    def _on_recommendation_request(self, payload, addr):
+        hand = HandState(Spieler._card_from_str(s) for s in payload["player_hand"])
+        up_card = Spieler._card_from_str(payload.get("dealer_up_card"))
+        if up_card is None or hand.total >= 21:
+            action, expected_value = "STAND", None
+        else:
+            #full shoe instead of the live composition, so the answer comes from the engine's cache
+            action, expected_value = Spieler.best_action(hand, up_card, self.shoe)
+        response = {"player_id": payload["player_id"], "recommended_action": action}
+        if "request_id" in payload:
+            response["request_id"] = payload["request_id"]
+        if expected_value is not None:
+            response["expected_value"] = expected_value
+        self.send({"type": "action_recommendation", "payload": response}, payload.get("player_listen_addr") or addr)
+
+    def _on_statistics_request(self, payload, addr):
+        self.send({"type": "statistics_response", "payload": {
+            "requester_id": payload.get("requester_id"),
+            "num_decks": self.num_decks,
+            "games": self.games,
+            "wins": self.wins,
+            "blackjacks": self.blackjacks,
+            "cards_used": sum(self.cards_used.values()),
+        }}, payload.get("requester_listen_addr") or addr)
+
+
+class _Seat:
+    __slots__ = ('player_id', 'nickname', 'addr', 'bet', 'hands', 'stakes', 'hand_index', 'surrendered')
+
+    def __init__(self, player_id, nickname, addr):
+        self.player_id = player_id
+        self.nickname = nickname
+        self.addr = addr
+        self.bet = 0
+        self.hands = []
+        self.stakes = []
+        self.hand_index = 0
+        self.surrendered = False
+
+
+class _Table:
+    def __init__(self, croupier, number):
+        self.croupier = croupier
+        self.number = number
+        self.seats = []
+        self.bets = {} #player_id -> (amount, nickname, addr) for the next round
+        self.in_round = []
+        self.turn = 0
+        self.dealer = HandState()
+        self.hole_card = None
+        self.shoe = []
+        self.reshuffled = False
+        self.timer = None
+        self.rounds = 0
+        self._shuffle()
+
+    def _shuffle(self):
+        self.shoe = [Card(suit, rank) for _ in range(self.croupier.num_decks) for suit in SUITS for rank in RANKS]
+        self.croupier.random.shuffle(self.shoe)
+        self.reshuffle_at = int(len(self.shoe) * (1 - PENETRATION))
+        self.reshuffled = True
+
+    def _draw(self):
+        return self.shoe.pop()
+
+    def _restart_timer(self, delay, callback):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = asyncio.get_running_loop().call_later(delay, callback)
+
+    def has_seat(self, player_id):
+        return any(seat.player_id == player_id for seat in self.seats)
+
+    def place_bet(self, player_id, nickname, amount, addr):
+        if not self.has_seat(player_id):
+            self.seats.append(_Seat(player_id, nickname, addr))
+        self.bets[player_id] = (amount, nickname, addr)
+        if self.in_round:
+            return #the bet is for the next round
+        if all(seat.player_id in self.bets for seat in self.seats) and (self.rounds or len(self.seats) >= self.croupier.seats_per_table):
+            self.start_round()
+        elif len(self.bets) == 1:
+            self._restart_timer(BET_WINDOW, self._bet_window_closed)
+
+    def _bet_window_closed(self):
+        self.timer = None
+        if not self.in_round and self.bets:
+            self.start_round()
+
+    def start_round(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if len(self.shoe) <= self.reshuffle_at:
+            self._shuffle()
+        reshuffled, self.reshuffled = self.reshuffled, False
+
+        self.in_round = []
+        for seat in self.seats:
+            bet = self.bets.pop(seat.player_id, None)
+            if bet is None:
+                continue
+            seat.bet, seat.nickname, seat.addr = bet
+            seat.hands = [HandState()]
+            seat.stakes = [seat.bet]
+            seat.hand_index = 0
+            seat.surrendered = False
+            self.in_round.append(seat)
+        self.seats = list(self.in_round) #seats without a bet are given up, they get a seat again with their next bet
+        self.dealer = HandState()
+        for _ in range(2):
+            for seat in self.in_round:
+                seat.hands[0].add(self._draw())
+            if len(self.dealer) == 0:
+                self.dealer.add(self._draw())
+        self.hole_card = self._draw()
+        self.croupier.counter_observe([card for seat in self.in_round for card in seat.hands[0]] + [self.dealer.cards[0]])
+
+        for seat in self.in_round:
+            payload = {"player_id": seat.player_id, "player_hand": [str(c) for c in seat.hands[0]],
+                       "dealer_up_card": str(self.dealer.cards[0]), "bet_amount": seat.bet}
+            if reshuffled and ANNOUNCE_RESHUFFLE:
+                payload["reshuffled"] = True
+            self.croupier.send({"type": "deal_cards", "payload": payload}, seat.addr)
+        self.turn = -1
+        self._next_turn()
+
+    def _current(self):
+        return self.in_round[self.turn] if 0 <= self.turn < len(self.in_round) else None
+
+    def _broadcast_update(self):
+        seat = self._current()
+        dealer_hand = [str(c) for c in self.dealer] + (["HIDDEN"] if self.hole_card is not None else [])
+        for other in self.in_round:
+            payload = {"player_id": other.player_id, "all_player_hands": [[str(c) for c in hand] for hand in other.hands],
+                       "dealer_hand": dealer_hand, "current_hand_index": other.hand_index}
+            if seat is not None:
+                payload["current_player_turn_id"] = seat.player_id
+                payload["current_player_turn_nickname"] = seat.nickname
+            self.croupier.send({"type": "game_update", "payload": payload}, other.addr)
+
+    #moves to the next seat (or the next hand of a split) that still has to act
+    def _next_turn(self):
+        seat = self._current()
+        if seat is not None and seat.hand_index + 1 < len(seat.hands):
+            seat.hand_index += 1
+            return self._prompt()
+        while True:
+            self.turn += 1
+            seat = self._current()
+            if seat is None:
+                return self._finish_round()
+            if not seat.hands[0].is_blackjack:
+                return self._prompt()
+
+    def _prompt(self):
+        seat = self._current()
+        hand = seat.hands[seat.hand_index]
+        if hand.total >= 21 or (len(seat.hands) > 1 and hand.cards[0].value == 11 and len(hand) == 2):
+            return self._next_turn() #21, bust or split aces, nothing to decide
+        self._broadcast_update()
+        self._restart_timer(ACTION_TIMEOUT, self._action_timeout)
+
+    def _action_timeout(self):
+        self.timer = None
+        seat = self._current()
+        if seat is not None:
+            self.croupier.action_timeouts += 1
+            log.warning("action_timeout", player=seat.nickname, timeout=ACTION_TIMEOUT)
+            self.player_action(seat.player_id, "STAND")
+
+    def player_action(self, player_id, action):
+        seat = self._current()
+        if seat is None or seat.player_id != player_id:
+            return #not this seat's turn (e.g. a late or repeated action)
+        hand = seat.hands[seat.hand_index]
+        if action == "HIT":
+            hand.add(self._draw())
+            self.croupier.counter_observe(hand.cards[-1:])
+            if hand.total >= 21:
+                return self._next_turn()
+            return self._prompt()
+        if action == "DOUBLE_DOWN" and len(hand) == 2:
+            seat.stakes[seat.hand_index] *= 2
+            hand.add(self._draw())
+            self.croupier.counter_observe(hand.cards[-1:])
+        elif action == "SPLIT" and hand.is_pair and len(seat.hands) == 1:
+            second = HandState((hand.cards[1],))
+            seat.hands = [HandState((hand.cards[0], self._draw())), second]
+            second.add(self._draw())
+            seat.stakes.append(seat.bet)
+            self.croupier.counter_observe([seat.hands[0].cards[1], second.cards[1]])
+            return self._prompt()
+        elif action == "SURRENDER" and len(hand) == 2 and len(seat.hands) == 1:
+            seat.surrendered = True
+        self._next_turn()
+
+    def _finish_round(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.dealer.add(self.hole_card)
+        self.hole_card = None
+        if any(hand.total <= 21 and not seat.surrendered for seat in self.in_round for hand in seat.hands):
+            while self.dealer.total < 17 or (self.dealer.total == 17 and self.dealer.soft and Spieler.DEALER_HITS_SOFT_17):
+                self.dealer.add(self._draw())
+        self.croupier.counter_observe(self.dealer.cards[1:])
+
+        dealer_hand = [str(c) for c in self.dealer]
+        for seat in self.in_round:
+            results = []
+            payout = 0
+            for hand, stake in zip(seat.hands, seat.stakes):
+                result, win = self._settle(seat, hand, stake)
+                results.append(result)
+                payout += win
+                self.croupier.counter_record(result)
+            self.croupier.send({"type": "game_result", "payload": {
+                "player_id": seat.player_id, "result": ",".join(results), "payout": payout,
+                "player_hand": [str(c) for c in seat.hands[0]], "dealer_hand": dealer_hand}}, seat.addr)
+        for seat in self.in_round:
+            self.croupier.send({"type": "round_ended", "payload": {"player_id": seat.player_id}}, seat.addr)
+        self.in_round = []
+        self.rounds += 1
+        self.croupier.rounds += 1
+        if self.bets:
+            if all(seat.player_id in self.bets for seat in self.seats):
+                self.start_round()
+            else:
+                self._restart_timer(BET_WINDOW, self._bet_window_closed)
+
+    #payout is the net win of a hand, like the real croupier (the player adds it to the capital)
+    def _settle(self, seat, hand, stake):
+        if seat.surrendered:
+            return "surrender", -stake / 2
+        if hand.is_bust:
+            return "lose", -stake
+        if hand.is_blackjack and len(seat.hands) == 1:
+            if self.dealer.is_blackjack:
+                return "push", 0
+            return "blackjack", stake * Spieler.BLACKJACK_PAYOUT
+        if self.dealer.is_blackjack or (self.dealer.total <= 21 and self.dealer.total > hand.total):
+            return "lose", -stake
+        if self.dealer.is_bust or hand.total > self.dealer.total:
+            return "win", stake
+        return "push", 0
+
+
+class StandInCroupier(_StandInProtocol):
+    def __init__(self, num_decks=None, seats_per_table=7, counter=None, reliable=False, seed=None):
+        super().__init__(reliable)
+        self.num_decks = num_decks or Spieler.NUM_DECKS
+        self.seats_per_table = seats_per_table
+        self.counter = counter
+        self.random = random.Random(seed)
+        self.tables = []
+        self.table_of = {} #player_id -> _Table
+        self.rounds = 0
+        self.action_timeouts = 0
+
+    def counter_observe(self, cards):
+        if self.counter is not None:
+            self.counter.observe(cards)
+
+    def counter_record(self, result):
+        if self.counter is not None:
+            self.counter.record_result(result)
+
+    def _on_bet(self, payload, addr):
+        player_id = payload["player_id"]
+        amount = payload["amount"]
+        reply_addr = payload.get("player_listen_addr") or addr
+        if not isinstance(amount, (int, float)) or not Spieler.TABLE_MIN <= amount <= Spieler.TABLE_MAX:
+            self.send({"type": "reject_bet", "payload": {"player_id": player_id,
+                                                         "reason": f"Einsatz muss zwischen {Spieler.TABLE_MIN} und {Spieler.TABLE_MAX} liegen"}}, reply_addr)
+            return
+        table = self.table_of.get(player_id)
+        if table is None:
+            table = next((t for t in self.tables if len(t.seats) < self.seats_per_table), None)
+            if table is None:
+                table = _Table(self, len(self.tables) + 1)
+                self.tables.append(table)
+            self.table_of[player_id] = table
+        table.place_bet(player_id, payload.get("player_nickname", player_id[:8]), amount, tuple(reply_addr))
+
+    def _on_player_action(self, payload, addr):
+        table = self.table_of.get(payload["player_id"])
+        if table is not None:
+            table.player_action(payload["player_id"], payload["action"])
+
+
+#binds a croupier and a counter on free loopback ports (port 0) and returns them
+async def start_stand_ins(ip="127.0.0.1", croupier_port=0, counter_port=0, num_decks=None, seats_per_table=7,
+                          reliable=False, seed=None):
+    loop = asyncio.get_running_loop()
+    _, counter = await loop.create_datagram_endpoint(lambda: StandInCounter(num_decks, reliable), local_addr=(ip, counter_port))
+    _, croupier = await loop.create_datagram_endpoint(lambda: StandInCroupier(num_decks, seats_per_table, counter, reliable, seed),
+                                                      local_addr=(ip, croupier_port))
+    return croupier, counter
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Lokaler Ersatz-Croupier und -Kartenzähler für Tests")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--croupier-port", type=int, default=9000)
+    parser.add_argument("--counter-port", type=int, default=9001)
+    parser.add_argument("--decks", type=int, default=Spieler.NUM_DECKS)
+    parser.add_argument("--seats", type=int, default=7, help="Plätze pro Tisch")
+    parser.add_argument("--binary", action="store_true", help="Binäres Nachrichtenformat akzeptieren und aushandeln")
+    parser.add_argument("--reliable", action="store_true", help="ACKs senden und eigene Nachrichten wiederholen")
+    parser.add_argument("--silent-reshuffle", action="store_true", help="Neues Mischen nicht in deal_cards ankündigen")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+async def _serve(args):
+    croupier, counter = await start_stand_ins(args.ip, args.croupier_port, args.counter_port, args.decks, args.seats,
+                                              args.reliable, args.seed)
+    print(f"Croupier: {args.ip}:{args.croupier_port}, Kartenzähler: {args.ip}:{args.counter_port}")
+    try:
+        while True:
+            await asyncio.sleep(Spieler.REPORT_INTERVAL)
+            log.flush()
+            print(f"{croupier.rounds} Runden, {len(croupier.tables)} Tisch(e), "
+                  f"{croupier.received + counter.received} Pakete empfangen, {croupier.sent + counter.sent} gesendet")
+    finally:
+        croupier.close()
+        counter.close()
+
+
+if __name__ == "__main__":
+    args = _parse_args(sys.argv[1:])
+    Spieler.NUM_DECKS = args.decks
+    Spieler.BINARY_WIRE = args.binary
+    ANNOUNCE_RESHUFFLE = not args.silent_reshuffle
+    log.set_level(Spieler.WARNING)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        print("\nTestumgebung wird heruntergefahren.")
+    log.flush()
@@ -0,0 +1,324 @@
+import asyncio
+
+import Spieler
+
+Spieler.log.set_level(Spieler.ERROR)
+
+SENDER = ("127.0.0.1", 9000)
+RECEIVER = ("127.0.0.1", 9001)
+
+
+#in-memory datagram link into a ReliableDelivery, every datagram goes through the impairment (if any) and arrives
+#in a later loop iteration like one from a socket
+class _Link:
+    def __init__(self, delivery, sender, deliver, impairment=None):
+        self.delivery = delivery
+        self.sender = sender
+        self.deliver = deliver
+        self.impairment = impairment
+        self.back = None #link for the acks
+        self.drop = None #callable(message) -> True for a message that is lost on the way
+
+    def sendto(self, data, peer):
+        arrive = asyncio.get_running_loop().call_soon
+        if self.impairment is not None:
+            self.impairment.deliver(arrive, self._arrive, data)
+        else:
+            arrive(self._arrive, data)
+
+    def _arrive(self, data):
+        message = Spieler.decode_datagram(data, self.sender)
+        if self.drop is None or not self.drop(message):
+            self.delivery.on_receive(message, self.sender, self.back, self.deliver)
+
+
+def _reliable_pair(impairment=None):
+    sender, receiver = Spieler.ReliableDelivery(), Spieler.ReliableDelivery()
+    sender.record_metrics = receiver.record_metrics = False
+    delivered = []
+    forward = _Link(receiver, SENDER, lambda message, peer: delivered.append(message["payload"]["n"]), impairment)
+    forward.back = _Link(sender, RECEIVER, lambda message, peer: None)
+    forward.back.back = forward
+    return sender, receiver, forward, delivered
+
+
+def test_lost_first_message_is_retransmitted_and_handled_first():
+    async def run():
+        impairment = Spieler.NetworkImpairment(loss=1.0)
+        sender, receiver, forward, delivered = _reliable_pair(impairment)
+        sender.send({"type": "bet", "payload": {"n": 0}}, RECEIVER, forward)
+        impairment.loss = 0.0 #only the first datagram is lost
+        sender.send({"type": "bet", "payload": {"n": 1}}, RECEIVER, forward)
+        await asyncio.sleep(0.01)
+        assert delivered == [] #seq 1 waits for seq 0
+        for _ in range(100):
+            if len(delivered) == 2:
+                break
+            await asyncio.sleep(0.01)
+        return impairment, sender, receiver, delivered
+
+    impairment, sender, receiver, delivered = asyncio.run(run())
+    assert impairment.dropped == 1
+    assert delivered == [0, 1]
+    assert sender.retransmissions == 1
+    assert receiver.duplicates == 0
+
+
+def test_invalid_sequence_numbers_are_rejected():
+    async def run():
+        sender, receiver, forward, delivered = _reliable_pair()
+        for seq in ("x", -1, 1.5, True, 2 ** 32):
+            receiver.on_receive({"type": "bet", "seq": seq, "payload": {"n": -1}}, SENDER, forward.back, forward.deliver)
+        receiver.on_receive({"type": "ack", "payload": {"seq": [0]}}, SENDER, forward.back, forward.deliver)
+        sender.send({"type": "bet", "payload": {"n": 0}}, RECEIVER, forward)
+        await asyncio.sleep(0.01)
+        return receiver, delivered
+
+    receiver, delivered = asyncio.run(run())
+    assert receiver.invalid == 6
+    assert delivered == [0]
+
+
+def test_gap_is_held_while_the_sender_still_retransmits():
+    async def run():
+        sender, receiver, forward, delivered = _reliable_pair()
+        lost = [6] #seq 0 and five retransmissions, it only gets through after more than a second
+
+        def drop(message):
+            if message.get("seq") == 0 and lost[0]:
+                lost[0] -= 1
+                return True
+            return False
+
+        forward.drop = drop
+        sender.send({"type": "bet", "payload": {"n": 0}}, RECEIVER, forward)
+        sender.send({"type": "bet", "payload": {"n": 1}}, RECEIVER, forward)
+        for _ in range(500):
+            if len(delivered) == 2 and not sender.peers[RECEIVER].pending:
+                break
+            await asyncio.sleep(0.01)
+        return sender, receiver, delivered
+
+    sender, receiver, delivered = asyncio.run(run())
+    assert delivered == [0, 1]
+    assert (receiver.skipped_gaps, receiver.duplicates, sender.failures) == (0, 0, 0)
+
+
+def test_skipped_message_is_handled_late_not_acked_as_duplicate():
+    async def run():
+        sender, receiver, forward, delivered = _reliable_pair()
+        receiver.on_receive({"type": "bet", "seq": 1, "payload": {"n": 1}}, SENDER, forward.back, forward.deliver)
+        receiver._skip_gap(SENDER)
+        receiver.on_receive({"type": "bet", "seq": 0, "payload": {"n": 0}}, SENDER, forward.back, forward.deliver)
+        receiver.on_receive({"type": "bet", "seq": 0, "payload": {"n": 0}}, SENDER, forward.back, forward.deliver)
+        return receiver, delivered
+
+    receiver, delivered = asyncio.run(run())
+    assert delivered == [1, 0]
+    assert (receiver.skipped_gaps, receiver.late, receiver.duplicates) == (1, 1, 1)
+
+
+def test_restarted_peer_starts_a_new_channel_in_both_directions():
+    async def run():
+        sender, receiver, forward, delivered = _reliable_pair()
+        for n in range(3):
+            sender.send({"type": "bet", "payload": {"n": n}}, RECEIVER, forward)
+        await asyncio.sleep(0.01)
+
+        restarted = Spieler.ReliableDelivery() #the sender is restarted on the same address
+        restarted.record_metrics = False
+        forward.back.delivery = restarted
+        restarted.send({"type": "bet", "payload": {"n": 3}}, RECEIVER, forward)
+        await asyncio.sleep(0.01)
+
+        forward.delivery = Spieler.ReliableDelivery() #now the receiver, its first message is numbered for the old one
+        forward.delivery.record_metrics = False
+        restarted.send({"type": "bet", "payload": {"n": 4}}, RECEIVER, forward)
+        await asyncio.sleep(0.01)
+        return restarted, forward.delivery, receiver, delivered
+
+    restarted, new_receiver, receiver, delivered = asyncio.run(run())
+    assert delivered == [0, 1, 2, 3, 4]
+    assert receiver.peer_restarts == 1 and restarted.peer_restarts == 1
+    assert new_receiver.stale == 1 and not restarted.peers[RECEIVER].pending
+
+
+def test_malformed_message_types_are_rejected():
+    Spieler.message_counters.clear()
+    for message in ({"type": []}, {"type": {"a": 1}}, [1, 2], "bet", {"type": "no_such_message"}):
+        Spieler._handle_message(message, SENDER)
+    assert Spieler.message_counters[None] == [0, 4]
+    assert Spieler.message_counters["no_such_message"] == [0, 1]
+
+
+class _Capture:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, peer):
+        self.sent.append(Spieler.decode_datagram(data, peer))
+
+
+def _seat_with_open_requests(echoes):
+    Spieler.RELIABLE = False
+    Spieler._recommendation_requests.clear()
+    via = _Capture()
+    session = Spieler.PlayerSession("p1", "Bot", 1000, via=via, counter_addr=SENDER)
+    session.recommendation_source = "counter"
+    Spieler.sessions.clear()
+    Spieler.sessions["p1"] = session
+    session.counter_echoes_request_id = echoes
+    session.dealer_up_card = Spieler.Card('S', '10')
+    session.prefetch_recommendations([Spieler.Card('S', '10'), Spieler.Card('S', '2')]) #hard 12
+    session.prefetch_recommendations([Spieler.Card('S', '10'), Spieler.Card('S', '9')]) #hard 19
+    return session, via
+
+
+def test_answers_without_request_id_are_not_guessed_while_prefetching():
+    session, via = _seat_with_open_requests(echoes=True)
+    assert len(session.pending_recommendations) == 2
+    Spieler._handle_message({"type": "action_recommendation", "payload": {"player_id": "p1", "recommended_action": "STAND"}}, SENDER)
+    assert len(session.pending_recommendations) == 2
+    assert session.recommendations.get(session.recommendation_key(
+        [Spieler.Card('S', '10'), Spieler.Card('S', '2')]), session.shoe.generation) is None
+
+
+def test_no_prefetch_until_the_counter_echoes_request_id():
+    session, via = _seat_with_open_requests(echoes=False)
+    assert via.sent == []
+    session.player_hand = Spieler.HandState([Spieler.Card('S', '10'), Spieler.Card('S', '2')])
+    session.request_recommendation_from_counter()
+    assert len(via.sent) == 1
+    Spieler._handle_message({"type": "action_recommendation", "payload": {"recommended_action": "HIT"}}, SENDER)
+    assert session.recommended_action == "HIT" and not session.pending_recommendations
+    assert not session.counter_echoes_request_id
+    assert session.recommendations.get(session.recommendation_key(session.player_hand.cards), session.shoe.generation) is None
+
+    session.request_recommendation_from_counter()
+    request_id = via.sent[-1]["payload"]["request_id"]
+    Spieler._handle_message({"type": "action_recommendation", "payload": {"recommended_action": "STAND",
+                                                                          "request_id": request_id}}, SENDER)
+    assert session.recommended_action == "STAND" and session.counter_echoes_request_id
+
+
+def test_malformed_datagrams_in_a_batch_dont_cost_the_valid_ones():
+    Spieler.RELIABLE = False
+    Spieler.impairment = None
+    Spieler.sessions.clear()
+    Spieler.message_counters.clear()
+    session = Spieler.PlayerSession("p1", "Bot", 1000, via=_Capture(), croupier_addr=SENDER)
+    Spieler.sessions["p1"] = session
+    batch = [{"type": "game_update", "payload": {"player_id": "p1", "current_player_turn_id": "p2"}},
+             {"type": []},
+             {"type": "game_update", "payload": {"player_id": ["x"]}},
+             {"type": "round_ended", "payload": {"player_id": {"a": 1}}},
+             [1, 2],
+             {"type": "game_result", "payload": {"player_id": "p1", "result": "win", "payout": 10}}]
+    decode_failed = Spieler.metrics.counters["binary_decode_failed"]
+    Spieler.PlayerProtocol().datagrams_received([(Spieler.json.dumps(message).encode(), SENDER) for message in batch])
+    assert Spieler.message_counters["game_update"] == [1, 1]
+    assert Spieler.message_counters["round_ended"] == [0, 1]
+    assert Spieler.message_counters[None] == [0, 1]
+    assert Spieler.metrics.counters["binary_decode_failed"] == decode_failed + 1 #not an object, so not JSON
+    assert Spieler.message_counters["game_result"] == [1, 0]
+    assert session.player_capital == 1010
+
+
+def test_hand_state_agrees_with_calculate_hand_value():
+    A, K, five, nine = Spieler.Card('S', 'A'), Spieler.Card('S', 'K'), Spieler.Card('S', '5'), Spieler.Card('S', '9')
+    for cards, total, soft in (([A, K, A], 12, False), ([A, five, five, A], 12, False), ([A, A], 12, True),
+                               ([A, A, nine], 21, True), ([A, A, nine, K], 21, False), ([A, K], 21, True)):
+        hand = Spieler.HandState(cards)
+        assert (hand.total, hand.soft, hand.is_bust) == (total, soft, False)
+        assert hand.total == Spieler.calculate_hand_value(cards)
+    assert Spieler.HandState([A, K]).is_blackjack
+    assert Spieler.HandState([K, nine, five]).is_bust
+
+
+def test_automatic_seat_bets_again_after_a_rejection_and_stops_after_several(monkeypatch):
+    monkeypatch.setattr(Spieler, "BET_RETRY", 0.0)
+    Spieler.RELIABLE = False
+    Spieler.sessions.clear()
+    via = _Capture()
+    session = Spieler.PlayerSession("p1", "Bot", 1000, via=via, auto=True, croupier_addr=SENDER)
+    Spieler.sessions["p1"] = session
+
+    async def run():
+        session.auto_bet()
+        for _ in range(Spieler.MAX_BET_REJECTIONS):
+            await asyncio.sleep(0.01)
+            Spieler._handle_message({"type": "reject_bet", "payload": {"player_id": "p1", "reason": "limit"}}, SENDER)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert [message["type"] for message in via.sent] == ["bet"] * Spieler.MAX_BET_REJECTIONS
+    assert session.finished
+
+
+def test_every_message_type_rejects_an_unhashable_player_id():
+    Spieler.message_counters.clear()
+    for msg_type in Spieler.MESSAGE_HANDLERS:
+        Spieler._handle_message({"type": msg_type, "payload": {"player_id": ["x"], "recommended_action": ["HIT"]}}, SENDER)
+        assert Spieler.message_counters[msg_type] == [0, 1]
+
+
+def test_deck_count_from_the_counter_is_bounded():
+    Spieler.sessions.clear()
+    Spieler.message_counters.clear()
+    session = Spieler.PlayerSession("p1", "Bot", 1000, via=_Capture(), counter_addr=SENDER)
+    Spieler.sessions["p1"] = session
+    for num_decks in (5000, 0, 9, True, 2.0):
+        Spieler._handle_message({"type": "statistics_response", "payload": {"num_decks": num_decks}}, SENDER)
+    assert Spieler.message_counters["statistics_response"] == [0, 5]
+    Spieler._handle_message({"type": "statistics_response", "payload": {"num_decks": 8}}, SENDER)
+    assert session.shoe.num_decks == 8 and session.shoe.remaining == 8 * 52
+
+
+def test_round_behind_the_cut_card_starts_a_new_shoe():
+    shoe = Spieler.ShoeTracker(1)
+    generation = shoe.generation
+    for rank in ('2', '3', '4', '5', '6', '2', '3'): #one card of ours and 2 other seats (5.4 unseen cards) per round
+        shoe.start_round()
+        shoe.observe([Spieler.Card('S', rank)])
+        shoe.other_seat("seat-1")
+        shoe.other_seat("seat-2")
+    assert shoe.generation == generation and shoe.running_count == 7 #52 - 7 - 6 * 5.4 cards left, more than 13
+    shoe.start_round() #52 - 7 - 7 * 5.4 is behind the cut card of a quarter deck
+    assert shoe.generation == generation + 1 and shoe.running_count == 0 and shoe.reshuffles == 1
+
+
+def test_datagram_that_cannot_be_decoded_doesnt_cost_its_batch():
+    Spieler.RELIABLE = False
+    Spieler.impairment = None
+    Spieler.sessions.clear()
+    Spieler.message_counters.clear()
+    session = Spieler.PlayerSession("p1", "Bot", 1000, via=_Capture(), croupier_addr=SENDER)
+    Spieler.sessions["p1"] = session
+    nested = b'{"type": ' + b"[" * 100000 + b"]" * 100000 + b"}"
+    result = Spieler.json.dumps({"type": "game_result", "payload": {"player_id": "p1", "result": "win", "payout": 10}}).encode()
+    decode_failed = Spieler.metrics.counters["json_decode_failed"]
+    Spieler.PlayerProtocol().datagrams_received([(nested, SENDER), (result, SENDER)])
+    assert Spieler.metrics.counters["json_decode_failed"] == decode_failed + 1
+    assert Spieler.message_counters["game_result"] == [1, 0]
+    assert session.player_capital == 1010
+
+
+def test_seats_of_a_shared_bankroll_bet_against_their_share(monkeypatch):
+    import Supervisor
+    shared = Supervisor.SharedBankroll(100000)
+    monkeypatch.setattr(Spieler, "bankroll", shared)
+    seats = [Spieler.PlayerSession("p%d" % i, "Bot", 0, via=_Capture()) for i in range(4)]
+    for seat in seats:
+        seat.join_bankroll()
+        seat.shoe.running_count = 10 * seat.shoe.num_decks #true count of 10
+    assert shared.seats == 4
+    bet = seats[0].determine_optimal_bet()
+    assert bet == Spieler.kelly_bet(25000, seats[0].shoe.edge) < Spieler.kelly_bet(100000, seats[0].shoe.edge)
+    assert shared.reserve(bet)
+    assert seats[1].determine_optimal_bet() == bet #running stakes still count to the shares
+    seats[0]._finish()
+    seats[0]._finish()
+    assert shared.seats == 3
+    for seat in seats[1:]:
+        seat.leave_bankroll()
+    assert shared.seats == 0